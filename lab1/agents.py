@@ -11,18 +11,50 @@
 #
 # @author Régis Clouard
 
-import copy
+import os
+import time
+import heapq
+import queue
+import multiprocessing
 import utils
+import frontier
+import hdastar
+from collections import OrderedDict
+from utils import SearchNode
 
 class Agent:
     """
     Abstract class for the agents that implement the various search strategies.
     It is based on the Strategy Design Pattern (abstract method is search()).
 
+    The open list of the best-first agents is chosen by name among
+    frontier.FRONTIERS ('indexed' by default, 'bucket' for integer costs).
+
     YOU DO NOT NEED TO CHANGE ANYTHING IN THIS CLASS, EVER.
     """
-    def search( self ):
-        """ This is the method to implement for each specific searcher."""
+    FRONTIER = 'indexed'
+
+    def __init__( self, frontier = None ):
+        self.frontier = frontier or self.FRONTIER
+
+    def new_frontier( self ):
+        """ Returns a new empty open list of the chosen kind."""
+        return frontier.make_frontier(self.frontier)
+
+    def new_stats( self, stats = None, budget = None ):
+        """ Returns the statistics object of a new search (a new one if None),
+        limited by the budget if given. It stays available in self.stats
+        once the search is over, even if the budget was exceeded."""
+        self.stats = stats if stats is not None else utils.SearchStats()
+        if budget is not None:
+            self.stats.use_budget(budget)
+        return self.stats
+
+    def search( self, initial_state, stats = None, budget = None ):
+        """ This is the method to implement for each specific searcher.
+        The counters of the search are updated in stats (a utils.SearchStats).
+        The budget (a utils.Budget) is checked at each expansion: the search
+        raises TimeoutFunctionException or NodeLimitException when it is over."""
         raise Exception("Invalid Agent class, search() not implemented")
 
  #  ______                               _                  __ 
@@ -34,40 +66,44 @@ class Agent:
 
 class DFS( Agent ):
 
-    def search( self, initial_state ):
+    def search( self, initial_state, stats = None, budget = None ):
         """ Depth-First Search.
 
         Returns the path as a list of directions among
         { Direction.left, Direction.right, Direction.up, Direction.down }
 
         """
-        open_list = [[ (initial_state, None) ]] # A state is a pair (board, direction)
+        stats = self.new_stats(stats, budget)
+        open_list = [ SearchNode(initial_state) ] # a node holds (state, parent, direction, g, h)
         closed_list = set([initial_state]) # keep already explored positions
 
         while open_list:
-            # Get the path at the top of the stack (pop() returns the last item of the list)
-            current_path = open_list.pop()
-            # Get the last place of that path
-            current_state, current_direction = current_path[-1]
+            # Get the node at the top of the stack (pop() returns the last item of the list)
+            current_node = open_list.pop()
+            current_state = current_node.state
+            stats.expand(len(open_list))
             # Check if we have reached the goal
             if current_state.is_goal_state():
-                # remove the start point and return only the directions.
-                return (list (map(lambda x : x[1], current_path[1:])))
+                # rebuild the directions from the start point.
+                return initial_state.expand_path(current_node.path())
             else:
                 # Check where we can go from here
                 next_steps = current_state.get_successor_states()
-                # Add the new paths (one step longer) to the stack
+                stats.generate(len(next_steps))
+                # Add the new nodes (one step longer) to the stack
                 for state, direction, weight in next_steps:
                     # do not add already explored states
                     if state not in closed_list:
                         # add at the end of the list
                         closed_list.add(state)
-                        open_list.append( (current_path + [ (state, direction) ]) )
+                        open_list.append( SearchNode(state, current_node, direction, current_node.g + weight) )
+                    else:
+                        stats.duplicate()
         return []
 
 class BFS( Agent ):
     
-    def search( self, initial_state ):
+    def search( self, initial_state, stats = None, budget = None ):
         """ Breadth-First Search
         
         Returns the path as a list of directions among
@@ -78,28 +114,33 @@ class BFS( Agent ):
         - state.get_successor_states(): Returns all states reachable from the state as a list of triplets (state, direction, cost).
         """
 
-        open_list = [[ (initial_state, None) ]] # A state is a pair (board, direction)
+        stats = self.new_stats(stats, budget)
+        open_list = frontier.FIFO()
+        open_list.push(SearchNode(initial_state)) # a node holds (state, parent, direction, g, h)
         closed_list = set([initial_state]) # keep already explored positions
 
-        while open_list:
-            # Get the path at the top of the stack (pop(0) returns the first item of the list)
-            current_path = open_list.pop(0)
-            # Get the last place of that path
-            current_state, current_direction = current_path[-1]
+        while not open_list.isEmpty():
+            # Get the node at the front of the queue
+            current_node, cost = open_list.pop()
+            current_state = current_node.state
+            stats.expand(len(open_list))
             # Check if we have reached the goal
             if current_state.is_goal_state():
-                # remove the start point and return only the directions.
-                return (list (map(lambda x : x[1], current_path[1:])))
+                # rebuild the directions from the start point.
+                return initial_state.expand_path(current_node.path())
             else:
                 # Check where we can go from here
                 next_steps = current_state.get_successor_states()
-                # Add the new paths (one step longer) to the stack
+                stats.generate(len(next_steps))
+                # Add the new nodes (one step longer) to the queue
                 for state, direction, weight in next_steps:
                     # do not add already explored states
                     if state not in closed_list:
-                        # add at the end of the list
+                        # add at the end of the queue
                         closed_list.add(state)
-                        open_list.append( (current_path + [ (state, direction) ]) )
+                        open_list.push( SearchNode(state, current_node, direction, current_node.g + weight) )
+                    else:
+                        stats.duplicate()
         return []
 
         # *** YOUR CODE HERE ***
@@ -113,7 +154,7 @@ class BFS( Agent ):
  # |______| /_/\_\  \___| |_|     \___| |_| |___/  \___|   |____|
 
 class UCS( Agent ):
-    def search( self, initial_state ):
+    def search( self, initial_state, stats = None, budget = None ):
         """ Uniform-Cost Search.
 
         It returns the path as a list of directions among
@@ -121,39 +162,57 @@ class UCS( Agent ):
         """
 
         # use a priority queue with the minimum queue.
-        from utils import PriorityQueue
-        open_list = PriorityQueue()
-        open_list.push([(initial_state, None)], 0) # a state is a pair (board, direction)
-        closed_list = set([initial_state]) # keep already explored positions
+        stats = self.new_stats(stats, budget)
+        open_list = self.new_frontier()
+        root = SearchNode(initial_state) # a node holds (state, parent, direction, g, h)
+        open_list.update(initial_state, root, 0)
+        best_nodes = { initial_state : root } # cheapest known node of each generated state
 
         while not open_list.isEmpty():
-            # Get the path at the top of the queue
-            current_path, cost = open_list.pop()
-            # Get the last place of that path
-            current_state, current_direction = current_path[-1]
+            # Get the node at the top of the queue
+            current_node, cost = open_list.pop()
+            current_state = current_node.state
+            if current_node is not best_nodes[current_state]:
+                continue # stale entry, a cheaper path was found since
+            stats.expand(len(open_list), cost)
             # Check if we have reached the goal
             if current_state.is_goal_state():
-                return (list (map(lambda x : x[1], current_path[1:])))
+                return initial_state.expand_path(current_node.path())
             else:
                 # Check were we can go from here
                 next_steps = current_state.get_successor_states()
-                # Add the new paths (one step longer) to the queue
+                stats.generate(len(next_steps))
+                # Add the new nodes (one step longer) to the queue
                 for state, direction, weight in next_steps:
-                    # Avoid loop!
-                    if state not in closed_list:
-                        closed_list.add(state)
-                        open_list.push((current_path + [ (state, direction) ]), cost + weight)
+                    g = current_node.g + weight
+                    known = best_nodes.get(state)
+                    # Only keep the cheapest path to each state (expanded
+                    # states are never improved, their cost is already minimal)
+                    if known is not None and known.g <= g:
+                        stats.duplicate()
+                        continue
+                    node = best_nodes[state] = SearchNode(state, current_node, direction, g)
+                    open_list.update(state, node, g)
         return []
     
     
 
 class GBFS( Agent ):
+    LAZY = False # deferred heuristic evaluation
+
+    def __init__( self, frontier = None, lazy = None ):
+        Agent.__init__(self, frontier)
+        self.lazy = self.LAZY if lazy is None else lazy
 
-    def search( self, initial_state ):
+    def search( self, initial_state, stats = None, budget = None ):
         """ Greedy Best First Search.
 
         Returns the path as a list of directions among
         { Direction.left, Direction.right, Direction.up, Direction.down }
+
+        In lazy mode, the children are queued with the h of their parent,
+        and their own h is only computed when they reach the top of the
+        queue; they are queued again if it is higher.
         
         Useful methods:
         - state.is_goal_state(): Returns true if the state is a valid goal state.
@@ -162,28 +221,54 @@ class GBFS( Agent ):
         """
 
         # use a priority queue with the minimum queue.
-        from utils import PriorityQueue
-        open_list = PriorityQueue()
-        open_list.push([(initial_state, None)], initial_state.heuristic()) # a state is a pair (board, direction)
-        closed_list = set([initial_state]) # keep already explored positions
+        stats = self.new_stats(stats, budget)
+        open_list = self.new_frontier()
+        h = stats.heuristic(initial_state)
+        root = SearchNode(initial_state, h = h) # a node holds (state, parent, direction, g, h)
+        open_list.update(initial_state, root, h, h)
+        best_nodes = { initial_state : root } # cheapest known node of each generated state
+        closed_list = set() # keep already expanded positions
 
         while not open_list.isEmpty():
-            # Get the path at the top of the queue
-            current_path, cost = open_list.pop()
-            # Get the last place of that path
-            current_state, current_direction = current_path[-1]
+            # Get the node at the top of the queue
+            current_node, cost = open_list.pop()
+            current_state = current_node.state
+            if current_node is not best_nodes[current_state] or current_state in closed_list:
+                continue # stale entry, a cheaper path was found since
+            if current_node.h is None: # deferred evaluation
+                current_node.h = stats.heuristic(current_state, deferred = True)
+                if current_node.h > cost:
+                    open_list.update(current_state, current_node, current_node.h, current_node.h)
+                    continue
+            closed_list.add(current_state)
+            stats.expand(len(open_list))
             # Check if we have reached the goal
             if current_state.is_goal_state():
-                return (list (map(lambda x : x[1], current_path[1:])))
+                return initial_state.expand_path(current_node.path())
             else:
                 # Check were we can go from here
                 next_steps = current_state.get_successor_states()
-                # Add the new paths (one step longer) to the queue
+                stats.generate(len(next_steps))
+                # Add the new nodes (one step longer) to the queue
                 for state, direction, weight in next_steps:
-                    # Avoid loop!
-                    if state not in closed_list:
-                        closed_list.add(state)
-                        open_list.push((current_path + [ (state, direction) ]), state.heuristic())
+                    g = current_node.g + weight
+                    # Greedy: expanded states are never reopened, but a state
+                    # still in the open list takes the shorter of its paths
+                    known = best_nodes.get(state)
+                    if known is not None and (state in closed_list or known.g <= g):
+                        stats.duplicate()
+                        continue
+                    h = known.h if known is not None else None
+                    if h is None and not self.lazy:
+                        h = stats.heuristic(state)
+                    node = best_nodes[state] = SearchNode(state, current_node, direction, g, h)
+                    if h is None:
+                        if known is None:
+                            stats.defer() # counted once per state
+                        # the queued entry of the state may have a lower priority
+                        open_list.replace(state, node, current_node.h, current_node.h)
+                    else:
+                        open_list.update(state, node, h, h)
         return []
 
  #  ______                               _                  ____  
@@ -193,15 +278,28 @@ class GBFS( Agent ):
  # | |____   >  <  |  __/ | |    | (__  | | \__ \ |  __/    ___) |
  # |______| /_/\_\  \___| |_|     \___| |_| |___/  \___|   |____/ 
 
-
-# TODO: fix case 2
 class ASS( Agent ):
-    def search( self, initial_state ):
+    LAZY = False # deferred heuristic evaluation
+
+    def __init__( self, frontier = None, lazy = None ):
+        Agent.__init__(self, frontier)
+        self.lazy = self.LAZY if lazy is None else lazy
+
+    def search( self, initial_state, stats = None, budget = None ):
         """ A Star Search.
 
         It returns the path as a list of directions among
         { Direction.left, Direction.right, Direction.up, Direction.down }
 
+        In lazy mode, the children are queued with their g plus the h of
+        their parent, and their own h is only computed when they reach the
+        top of the queue; they are queued again if their f is higher. The
+        children never expanded cost no heuristic call. With a consistent
+        heuristic, the f of a child is at least its queued priority minus
+        its step cost, so a goal of cost C is only returned once every
+        priority below C plus the largest deferred step cost is checked:
+        the solution stays optimal.
+
         Useful methods:
         - state.is_goal_state(): Returns true if the state is a valid goal state.
         - state.get_successor_states(): Returns all states reachable from the specified state as a list of triplets (state, direction, cost)
@@ -210,28 +308,71 @@ class ASS( Agent ):
         """
         
         # use a priority queue with the minimum queue.
-        from utils import PriorityQueue
-        open_list = PriorityQueue()
-        open_list.push([(initial_state, None)], initial_state.heuristic()) # a state is a pair (board, direction)
-        closed_list = set([initial_state]) # keep already explored positions
+        stats = self.new_stats(stats, budget)
+        open_list = self.new_frontier()
+        h = stats.heuristic(initial_state)
+        root = SearchNode(initial_state, h = h) # a node holds (state, parent, direction, g, h)
+        open_list.update(initial_state, root, h, h)
+        best_nodes = { initial_state : root } # cheapest known node of each generated state
+        closed_list = set() # keep already expanded positions
+        goal_node = None # lazy mode: best goal found, returned once no deferred node can beat it
+        slack = 0 # lazy mode: largest step cost of the deferred children
 
         while not open_list.isEmpty():
-            # Get the path at the top of the queue
-            current_path, cost = open_list.pop()
-            # Get the last place of that path
-            current_state, current_direction = current_path[-1]
+            # Get the node at the top of the queue
+            current_node, cost = open_list.pop()
+            current_state = current_node.state
+            if current_node is not best_nodes[current_state]:
+                continue # stale entry, a cheaper path was found since
+            if current_node.h is None: # deferred evaluation
+                current_node.h = stats.heuristic(current_state, deferred = True)
+                if current_node.g + current_node.h > cost:
+                    open_list.update(current_state, current_node, current_node.g + current_node.h, current_node.h)
+                    continue
+            if goal_node is not None:
+                if current_node is goal_node:
+                    if cost < goal_node.g + slack: # the slack grew since it was queued
+                        open_list.update(current_state, goal_node, goal_node.g + slack, goal_node.h)
+                        continue
+                    return initial_state.expand_path(goal_node.path())
+                if current_node.g + current_node.h >= goal_node.g:
+                    continue # cannot lead to a better goal
+            closed_list.add(current_state)
+            stats.expand(len(open_list), current_node.g + current_node.h)
             # Check if we have reached the goal
             if current_state.is_goal_state():
-                return (list (map(lambda x : x[1], current_path[1:])))
+                if slack == 0:
+                    return initial_state.expand_path(current_node.path())
+                goal_node = current_node
+                open_list.update(current_state, current_node, current_node.g + slack, current_node.h)
             else:
                 # Check were we can go from here
                 next_steps = current_state.get_successor_states()
-                # Add the new paths (one step longer) to the queue
+                stats.generate(len(next_steps))
+                # Add the new nodes (one step longer) to the queue
                 for state, direction, weight in next_steps:
-                    # Avoid loop!
-                    if state not in closed_list:
-                        closed_list.add(state)
-                        open_list.push((current_path + [ (state, direction) ]), (cost + weight + state.heuristic()))
+                    g = current_node.g + weight
+                    known = best_nodes.get(state)
+                    # Only keep the cheapest path to each state
+                    if known is not None and known.g <= g:
+                        stats.duplicate()
+                        continue
+                    if state in closed_list:
+                        # an inconsistent heuristic closed it too early
+                        closed_list.discard(state)
+                        stats.reopen()
+                    h = known.h if known is not None else None
+                    if h is None and not self.lazy:
+                        h = stats.heuristic(state)
+                    node = best_nodes[state] = SearchNode(state, current_node, direction, g, h)
+                    if h is None:
+                        if known is None:
+                            stats.defer() # counted once per state
+                        slack = max(slack, weight)
+                        # the queued entry of the state may have a lower priority
+                        open_list.replace(state, node, g + current_node.h, current_node.h)
+                    else:
+                        open_list.update(state, node, g + h, h)
         return []
 
  #  ______                               _                  _  _   
@@ -243,7 +384,7 @@ class ASS( Agent ):
 
 class IDS( Agent ):
     MAX_PATH_LENGTH = 500 # Found in literature
-    def search( self, initial_state ):
+    def search( self, initial_state, stats = None, budget = None ):
         """ Iterative Deepening Search.
 
         Returns the path as a list of directions among
@@ -257,74 +398,42 @@ class IDS( Agent ):
         
 
         
+        stats = self.new_stats(stats, budget)
         max_depth = 0
 
         while(max_depth<self.MAX_PATH_LENGTH):
-            open_list = [[ (initial_state, None) ]] # A state is a pair (board, direction)
-            closed_list = { initial_state : 0 } # keep already explored positions
+            open_list = [ SearchNode(initial_state) ] # a node holds (state, parent, direction, g, h)
+            closed_list = { initial_state : 0 } # keep already explored positions with their depth
             while open_list:
-                # Get the path at the top of the stack (pop() returns the last item of the list)
-                current_path = open_list.pop()
-                depth = len(current_path)
-                # Get the last place of that path
-                current_state, current_direction = current_path[-1]
+                # Get the node at the top of the stack (pop() returns the last item of the list)
+                current_node = open_list.pop()
+                depth = current_node.g
+                current_state = current_node.state
+                stats.expand(len(open_list))
                 # Check if we have reached the goal
                 if current_state.is_goal_state():
-                    # remove the start point and return only the directions.
-                    return (list (map(lambda x : x[1], current_path[1:])))
-                if depth-1 < max_depth :
+                    # rebuild the directions from the start point.
+                    return initial_state.expand_path(current_node.path())
+                if depth < max_depth :
                     # Check where we can go from here
                     next_steps = current_state.get_successor_states()
-                    # Add the new paths (one step longer) to the stack
+                    stats.generate(len(next_steps))
+                    # Add the new nodes (one step longer) to the stack
                     for state, direction, weight in next_steps:
                         # do not add already explored states
-                        if state not in closed_list or closed_list[state] > depth-1:
+                        if state not in closed_list or closed_list[state] > depth + 1:
+                            if state in closed_list:
+                                stats.reopen()
                             # add at the end of the list
-                            closed_list[state] = depth
-                            open_list.append( (current_path + [ (state, direction) ]) )
+                            closed_list[state] = depth + 1
+                            open_list.append( SearchNode(state, current_node, direction, depth + 1) )
+                        else:
+                            stats.duplicate()
                 
            
             max_depth += 1
 
-        # max_depth = 0  # Start with depth 0
-#
-        # while True:
-        #     # open_list holds the paths to explore (stack-style DFS)
-        #     open_list = [[(initial_state, None)]]  # A state is a pair (state, direction)
-        #     # closed_list is a dictionary that tracks the depth at which each state was visited
-        #     closed_list = {initial_state: 0}  # Track the start state and its depth (0)
-
-        #     # DFS for the current max depth limit
-        #     found_solution = False
-        #     while open_list:
-        #         current_path = open_list.pop()  # Get the last path from the stack
-        #         current_state, current_direction = current_path[-1]  # Get the current state and direction
-
-        #         # Check if the goal has been reached
-        #         if current_state.is_goal_state():
-        #             # Return only the directions (skip the initial state)
-        #             return [direction for _, direction in current_path[1:]]
-
-        #         # If we haven't exceeded the max depth, expand the state
-        #         if len(current_path) - 1 < max_depth:
-        #             # Get the successors of the current state
-        #             next_steps = current_state.get_successor_states()
-
-        #             # Expand the state by adding its successor states
-        #             for state, direction, weight in next_steps:
-        #                 # Only add the state to the open list if it hasn't been visited at the current depth
-        #                 if state not in closed_list or closed_list[state] > len(current_path) - 1:
-        #                     closed_list[state] = len(current_path)  # Mark state with the current depth
-        #                     open_list.append(current_path + [(state, direction)])  # Add new path to the open list
-
-        #     # If no solution is found at this depth, increase the max_depth and continue the search
-        #     max_depth += 1
-
-
-            
-    
-
-    
+        return []
 
  #  ______                               _                  _____ 
  # |  ____|                             (_)                | ____|
@@ -334,41 +443,605 @@ class IDS( Agent ):
  # |______| /_/\_\  \___| |_|     \___| |_| |___/  \___|   |____/ 
 class IDASS( Agent ):
     MAX_PATH_LENGTH = 500 # Found in literature
-    def search( self, initial_state ):
+    TABLE_SIZE = 0 # no transposition table by default: O(depth) memory
+
+    def __init__( self, frontier = None, table_size = None ):
+        Agent.__init__(self, frontier)
+        self.table_size = self.TABLE_SIZE if table_size is None else table_size
+
+    def search( self, initial_state, stats = None, budget = None ):
         """ Iterative deepening A*
         
         Returns the path as a list of directions among
         { Direction.left, Direction.right, Direction.up, Direction.down }.
 
+        Each iteration is a depth-first search that cuts the nodes whose
+        f = g + h exceeds the bound; the next bound is the smallest f that
+        was cut. Only the current path is kept in memory, plus an optional
+        transposition table of at most table_size states (least recently
+        used states are forgotten first).
+
         Useful methods:
         - state.is_goal_state(): Returns true if the state is a valid goal state.
         - state.get_successor_states(): Returns all states reachable from the specified state as a list of triplets (state, direction, cost)
         - state.heuristic(): Returns the heuristic value for the specified state.
         """
+        stats = self.new_stats(stats, budget)
+        root = SearchNode(initial_state, h = stats.heuristic(initial_state)) # a node holds (state, parent, direction, g, h)
+        bound = root.h
+        while bound <= self.MAX_PATH_LENGTH:
+            self.path_states = set([initial_state]) # states of the current path, to avoid loops
+            self.table = OrderedDict() # state -> lowest g reached during this iteration
+            goal_node, bound = self.bounded_search(root, bound, stats)
+            if goal_node is not None:
+                return initial_state.expand_path(goal_node.path())
+        return []
 
-        # use a priority queue with the minimum queue.
-        from utils import PriorityQueue
-        open_list = PriorityQueue()
-        open_list.push([(initial_state, None)], 0) # a state is a pair (board, direction)
-        closed_list = set([initial_state]) # keep already explored positions
+    def bounded_search( self, current_node, bound, stats ):
+        """ Depth-first search below the bound. Returns the goal node (or
+        None) and the smallest f value that exceeded the bound. """
+        f = current_node.g + current_node.h
+        if f > bound:
+            return None, f
+        current_state = current_node.state
+        if current_state.is_goal_state():
+            return current_node, f
+        stats.expand(len(self.path_states), f)
+        next_steps = current_state.get_successor_states()
+        stats.generate(len(next_steps))
+        next_bound = float('inf')
+        for state, direction, weight in next_steps:
+            if state in self.path_states:
+                stats.duplicate()
+                continue
+            g = current_node.g + weight
+            if self.table_size > 0:
+                # this state was already searched from a shorter path, with the same bound
+                if state in self.table and self.table[state] <= g:
+                    self.table.move_to_end(state)
+                    stats.duplicate()
+                    continue
+                self.table[state] = g
+                self.table.move_to_end(state)
+                if len(self.table) > self.table_size:
+                    self.table.popitem(last = False)
+            node = SearchNode(state, current_node, direction, g, stats.heuristic(state))
+            self.path_states.add(state)
+            goal_node, cut = self.bounded_search(node, bound, stats)
+            self.path_states.remove(state)
+            if goal_node is not None:
+                return goal_node, cut
+            next_bound = min(next_bound, cut)
+        return None, next_bound
 
-        while not open_list.isEmpty():
-            # Get the path at the top of the queue
-            current_path, cost = open_list.pop()
-            # Get the last place of that path
-            current_state, current_direction = current_path[-1]
-            # Check if we have reached the goal
-            if current_state.is_goal_state():
-                return (list (map(lambda x : x[1], current_path[1:])))
+class BDS( Agent ):
+    def search( self, initial_state, stats = None, budget = None ):
+        """ Bidirectional Search over crate pushes.
+
+        Returns the path as a list of directions among
+        { Direction.left, Direction.right, Direction.up, Direction.down }.
+
+        A forward breadth-first search pushes the crates from the start
+        state while a backward one pulls them from the goal states (every
+        hole filled, see state.get_goal_states()). Both sides are
+        normalized states, so they meet when a state generated on one side
+        is already in the index of the other one. The smaller side is
+        expanded one whole layer at a time, and the cheapest meeting of the
+        first layer that meets the other side gives the minimum number of
+        pushes. Successors are single pushes whatever state.use_push_moves()
+        and state.use_macro_moves() say.
+        """
+        stats = self.new_stats(stats, budget)
+        start = initial_state.__copy__()
+        start.normalize()
+        if start.is_goal_state():
+            return []
+        forward = { start : SearchNode(start) } # state -> node, for each side
+        backward = {}
+        for state in start.get_goal_states():
+            backward[state] = SearchNode(state)
+        forward_layer = list(forward.values())
+        backward_layer = list(backward.values())
+        while forward_layer and backward_layer:
+            if len(forward_layer) <= len(backward_layer):
+                forward_layer, meeting = self.expand_layer(forward_layer, forward, backward, True, stats)
             else:
-                # Check were we can go from here
-                next_steps = current_state.get_successor_states()
-                # Add the new paths (one step longer) to the queue
+                backward_layer, meeting = self.expand_layer(backward_layer, backward, forward, False, stats)
+            if meeting is not None:
+                forward_node, backward_node = meeting
+                # the backward actions are already pushes, from the meeting state to a goal
+                actions = forward_node.path()
+                while backward_node.parent is not None:
+                    actions.append(backward_node.action)
+                    backward_node = backward_node.parent
+                return initial_state.expand_path(actions)
+        return []
+
+    def expand_layer( self, layer, nodes, other_nodes, forward, stats ):
+        """ Expands every node of the layer, indexing the new states in
+        nodes. Returns the next layer and the cheapest meeting with
+        other_nodes as a (forward node, backward node) pair, or None. """
+        next_layer = []
+        meeting = None
+        best_cost = float('inf')
+        for current_node in layer:
+            stats.expand(len(layer) + len(next_layer))
+            if forward:
+                next_steps = current_node.state.get_push_successor_states(use_macros = False) # one push per layer
+            else:
+                next_steps = current_node.state.get_pull_successor_states()
+            stats.generate(len(next_steps))
+            for state, action, weight in next_steps:
+                if state in nodes:
+                    stats.duplicate()
+                    continue
+                node = nodes[state] = SearchNode(state, current_node, action, current_node.g + weight)
+                next_layer.append(node)
+                other_node = other_nodes.get(state)
+                if other_node is not None and node.g + other_node.g < best_cost:
+                    best_cost = node.g + other_node.g
+                    meeting = (node, other_node) if forward else (other_node, node)
+        return next_layer, meeting
+
+class HDASS( Agent ):
+    WORKERS = None # one worker per CPU core by default
+
+    def __init__( self, frontier = None, workers = None ):
+        Agent.__init__(self, frontier)
+        self.workers = workers or self.WORKERS or os.cpu_count() or 1
+
+    def search( self, initial_state, stats = None, budget = None ):
+        """ Hash-distributed A* Search over several processes (see hdastar.py).
+
+        Returns the path as a list of directions among
+        { Direction.left, Direction.right, Direction.up, Direction.down }.
+
+        This method is the coordinator: it seeds the owner of the start
+        state, keeps the incumbent, detects the termination and rebuilds
+        the path. The counters of the workers are added to stats at the end.
+        """
+        stats = self.new_stats(stats, budget)
+        workers = self.workers
+        inboxes = [multiprocessing.Queue() for worker in range(workers)]
+        results = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target = hdastar.run_worker, args = (worker, initial_state, inboxes, results))
+                     for worker in range(workers)]
+        for process in processes:
+            process.start()
+        try:
+            root = (initial_state.player, initial_state.crates, initial_state.zobrist, 0, None, None)
+            inboxes[hdastar.owner(initial_state.zobrist, workers)].put(('nodes', [root]))
+            goal = self.wait_for_termination(inboxes, results, processes, stats)
+            actions = []
+            key = goal
+            while key is not None:
+                inboxes[hdastar.owner(key[2], workers)].put(('trace', key))
+                message = self.receive(results, processes)
+                while message[0] != 'parent': # late idle notices or probe answers
+                    message = self.receive(results, processes)
+                key, action = message[1], message[2]
+                if key is not None:
+                    actions.append(action)
+            actions.reverse()
+            for inbox in inboxes:
+                inbox.put(('stop',))
+            running = list(processes)
+            while any(process is not None for process in running):
+                message = self.receive(results, running)
+                if message[0] == 'stats':
+                    running[message[1]] = None # it exits once its counters are sent
+                    for name, value in message[2].items():
+                        if name == 'peak_frontier':
+                            stats.frontier_peak += value
+                        else:
+                            setattr(stats, name, getattr(stats, name) + value)
+            for process in processes:
+                process.join()
+        finally:
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+        if goal is None:
+            return []
+        return initial_state.expand_path(actions)
+
+    def receive( self, results, processes, stats = None ):
+        """ Returns the next message of the workers. The budget of stats,
+        if given, is checked while waiting. Raises WorkerFailedException
+        if one of the processes (None for the workers done) has exited. """
+        while True:
+            if stats is not None:
+                stats.check_budget()
+            try:
+                return results.get(timeout = 1)
+            except queue.Empty:
+                for worker, process in enumerate(processes):
+                    if process is not None and process.exitcode is not None:
+                        raise utils.WorkerFailedException("HDASS worker %d exited with code %s" % (worker, process.exitcode))
+
+    def wait_for_termination( self, inboxes, results, processes, stats ):
+        """ Handles the messages of the workers until none of them has a
+        node below the incumbent. Returns the key of the goal node of the
+        incumbent (None if there is no solution). The budget of stats is
+        checked between the messages, the workers are not limited. """
+        workers = len(inboxes)
+        sent = 1 # the root batch
+        incumbent = float('inf')
+        goal = None
+        wave = 0
+        answers = None # probe answers of the current wave, None if no wave
+        previous = None # answers of the last complete wave
+        idle_notice = False
+        while True:
+            message = self.receive(results, processes, stats)
+            kind = message[0]
+            if kind == 'solution':
+                if message[1] < incumbent:
+                    incumbent, goal = message[1], message[2]
+                    for inbox in inboxes:
+                        inbox.put(('incumbent', incumbent))
+            elif kind == 'idle':
+                idle_notice = True
+            elif kind == 'status' and message[2] == wave and answers is not None:
+                answers[message[1]] = message[3:]
+            if answers is not None and len(answers) == workers:
+                snapshot = tuple(answers[worker] for worker in range(workers))
+                all_idle = all(idle for idle, worker_sent, worker_received in snapshot)
+                balanced = sent + sum(s for idle, s, r in snapshot) == sum(r for idle, s, r in snapshot)
+                if all_idle and balanced and snapshot == previous:
+                    return goal
+                previous = snapshot
+                answers = None
+                idle_notice = idle_notice or all_idle
+            if answers is None and idle_notice:
+                # start a new probe wave
+                wave += 1
+                answers = {}
+                idle_notice = False
+                for inbox in inboxes:
+                    inbox.put(('probe', wave))
+
+class ARASS( Agent ):
+    WEIGHT = 1.5 # initial weight of the heuristic
+    WEIGHT_STEP = 0.25 # weight decrease after each solution
+
+    def __init__( self, frontier = None, weight = None, weight_step = None, time_budget = None ):
+        Agent.__init__(self, frontier)
+        if self.frontier == 'bucket':
+            raise ValueError("ARASS needs a frontier that accepts fractional priorities (g + weight * h), not 'bucket'")
+        self.weight = weight or self.WEIGHT
+        self.weight_step = weight_step or self.WEIGHT_STEP
+        self.time_budget = time_budget
+        self.solutions = [] # (time, weight, cost) of each improved solution
+
+    def search( self, initial_state, stats = None, budget = None ):
+        """ Anytime Repairing A* (ARA*).
+
+        Returns the path as a list of directions among
+        { Direction.left, Direction.right, Direction.up, Direction.down }.
+
+        A first weighted A* search (f = g + weight * h) finds a solution
+        quickly. The weight is then decreased down to 1 and the search is
+        resumed with the same nodes: the open list is reordered with the
+        new weight and the states improved after their expansion, kept
+        apart in the inconsistent list, are put back in it. Each solution
+        costs at most weight times the optimal cost (with an admissible
+        heuristic), and the last one is optimal.
+
+        The search stops when the time budget (in seconds) or the budget
+        of the search (a utils.Budget) is over, or when a TimeoutFunction
+        expires, and the best solution found so far is returned.
+        """
+        stats = self.new_stats(stats, budget)
+        self.solutions = []
+        deadline = None if self.time_budget is None else time.time() + self.time_budget
+        weight = self.weight
+        root = SearchNode(initial_state, h = stats.heuristic(initial_state)) # a node holds (state, parent, direction, g, h)
+        if initial_state.is_goal_state():
+            return []
+        best_nodes = { initial_state : root } # cheapest known node of each generated state
+        open_list = self.new_frontier()
+        open_list.update(initial_state, root, weight * root.h, root.h)
+        self.goal_node = None
+        try:
+            while True:
+                inconsistent = self.improve_path(open_list, best_nodes, weight, deadline, stats)
+                if self.goal_node is not None:
+                    self.solutions.append((stats.elapsed(), weight, self.goal_node.g))
+                if weight <= 1 or inconsistent is None:
+                    break
+                # resume with a lower weight: reorder the open list, plus the inconsistent states
+                weight = max(1.0, weight - self.weight_step)
+                waiting = inconsistent
+                while not open_list.isEmpty():
+                    node, f = open_list.pop()
+                    waiting.append(node)
+                open_list = self.new_frontier()
+                for node in waiting:
+                    if node is best_nodes[node.state] and self.is_promising(node):
+                        open_list.update(node.state, node, node.g + weight * node.h, node.h)
+        except (utils.NodeLimitException, utils.TimeoutFunctionException):
+            pass
+        if self.goal_node is None:
+            return []
+        return initial_state.expand_path(self.goal_node.path())
+
+    def is_promising( self, node ):
+        """ Returns True if the node may lead to a better solution than the
+        best one found so far (its h is admissible, not weighted). """
+        return self.goal_node is None or node.g + node.h < self.goal_node.g
+
+    def improve_path( self, open_list, best_nodes, weight, deadline, stats ):
+        """ Weighted A* until no node of the open list can lead to a better
+        solution. Returns the nodes improved after their expansion during
+        this search, or None if the time budget is over. """
+        closed_list = set() # states expanded with this weight
+        inconsistent = []
+        while not open_list.isEmpty():
+            if deadline is not None and time.time() > deadline:
+                return None
+            current_node, f = open_list.pop()
+            current_state = current_node.state
+            if current_node is not best_nodes[current_state] or current_state in closed_list:
+                continue # stale entry
+            if self.goal_node is not None and f >= self.goal_node.g:
+                open_list.update(current_state, current_node, f, current_node.h) # kept for the next weight
+                break
+            closed_list.add(current_state)
+            stats.expand(len(open_list))
+            next_steps = current_state.get_successor_states()
+            stats.generate(len(next_steps))
+            for state, direction, weight_of_step in next_steps:
+                g = current_node.g + weight_of_step
+                known = best_nodes.get(state)
+                if known is not None and known.g <= g:
+                    stats.duplicate()
+                    continue
+                h = known.h if known is not None else stats.heuristic(state)
+                node = best_nodes[state] = SearchNode(state, current_node, direction, g, h)
+                if state.is_goal_state():
+                    if self.goal_node is None or g < self.goal_node.g:
+                        self.goal_node = node
+                    continue
+                if not self.is_promising(node):
+                    continue
+                if state in closed_list:
+                    stats.reopen()
+                    inconsistent.append(node)
+                else:
+                    open_list.update(state, node, g + weight * h, h)
+        return inconsistent
+
+def node_cap( state, max_nodes = None, max_bytes = None ):
+    """ Returns the maximum number of stored nodes allowed by max_nodes
+    and by max_bytes (converted with utils.node_bytes), None if none. """
+    caps = []
+    if max_nodes is not None:
+        caps.append(max_nodes)
+    if max_bytes is not None:
+        caps.append(max(1, max_bytes // utils.node_bytes(state)))
+    return min(caps) if caps else None
+
+class BEAM( Agent ):
+    WIDTH = 1000 # states kept per depth layer
+
+    def __init__( self, frontier = None, width = None, max_nodes = None, max_bytes = None ):
+        Agent.__init__(self, frontier)
+        self.width = width or self.WIDTH
+        self.max_nodes = max_nodes
+        self.max_bytes = max_bytes
+
+    def search( self, initial_state, stats = None, budget = None ):
+        """ Beam Search.
+
+        Returns the path as a list of directions among
+        { Direction.left, Direction.right, Direction.up, Direction.down }.
+
+        A breadth-first search that only keeps the width best successors
+        (lowest heuristic) of each depth layer. It is not complete: it
+        fails when the beam runs out of states, or when the stored nodes
+        (the states of the beams, to avoid revisiting them) would exceed
+        max_nodes or max_bytes.
+        """
+        stats = self.new_stats(stats, budget)
+        cap = node_cap(initial_state, self.max_nodes, self.max_bytes)
+        layer = [ SearchNode(initial_state, h = stats.heuristic(initial_state)) ] # a node holds (state, parent, direction, g, h)
+        visited = set([initial_state]) # states of all the beams so far
+        while layer:
+            candidates = {}
+            for current_node in layer:
+                stats.expand(len(layer))
+                if current_node.state.is_goal_state():
+                    return initial_state.expand_path(current_node.path())
+                next_steps = current_node.state.get_successor_states()
+                stats.generate(len(next_steps))
                 for state, direction, weight in next_steps:
-                    # Avoid loop!
-                    if state not in closed_list:
-                        closed_list.add(state)
-                        open_list.push((current_path + [ (state, direction) ]), (cost + weight + state.heuristic()))
+                    if state in visited or state in candidates:
+                        stats.duplicate()
+                        continue
+                    h = stats.heuristic(state)
+                    if h != float('inf'):
+                        candidates[state] = SearchNode(state, current_node, direction, current_node.g + weight, h)
+                if cap is not None and len(visited) + len(candidates) > cap:
+                    return [] # out of memory
+            layer = heapq.nsmallest(self.width, candidates.values(), key = lambda node: (node.h, node.g))
+            visited.update(node.state for node in layer)
         return []
 
+class SMASS( Agent ):
+    MAX_NODES = 100000 # default memory bound
+
+    def __init__( self, frontier = None, max_nodes = None, max_bytes = None ):
+        Agent.__init__(self, frontier)
+        self.max_nodes = max_nodes
+        self.max_bytes = max_bytes
+
+    def search( self, initial_state, stats = None, budget = None ):
+        """ Simplified Memory-bounded A* (SMA*).
+
+        Returns the path as a list of directions among
+        { Direction.left, Direction.right, Direction.up, Direction.down }.
+
+        A* that stores at most max_nodes nodes (or max_bytes bytes, see
+        node_cap): the deepest node of lowest f generates its successors
+        one at a time and, when the memory is full, the shallowest leaf of
+        highest f is forgotten. Its f is remembered by its parent, which
+        regenerates it if it becomes the best node again. Once all its
+        successors are generated, the f of a node is backed up to the
+        lowest f of its children, forgotten ones included (infinite if
+        none is left). A node that is not a goal at the depth max_nodes - 1
+        gets an infinite f, since the memory cannot hold a longer path.
+        Optimal if the memory can hold the optimal path; fails when it
+        cannot.
+
+        A successor is skipped if its state is already in memory with a
+        lower or equal g (the tree would otherwise fill up with copies).
+        """
+        stats = self.new_stats(stats, budget)
+        cap = node_cap(initial_state, self.max_nodes, self.max_bytes) or self.MAX_NODES
+        h = stats.heuristic(initial_state)
+        root = utils.MemoryNode(initial_state, h = h, f = h)
+        self.best = [] # heap of (f, -depth, counter, version, node)
+        self.worst = [] # heap of (-f, depth, counter, version, node)
+        self.counter = 0
+        self.queued = 0
+        self.enqueue(root)
+        self.in_memory = { initial_state : root } # state -> its cheapest node in memory
+        stored = 1
+        while self.queued:
+            current_node = self.pop_best()
+            if current_node.f == float('inf'):
+                return []
+            if current_node.state.is_goal_state():
+                return initial_state.expand_path(current_node.path())
+            successor = self.next_successor(current_node, stats)
+            if successor is None:
+                # nothing left to generate: its f comes from its children
+                self.backup(current_node)
+                if current_node.children or current_node.f == float('inf'):
+                    self.dequeue(current_node)
+                    if not current_node.children and current_node.parent is not None:
+                        self.enqueue(current_node) # dead end, forgotten first
+                continue
+            state, direction, weight = successor
+            g = current_node.g + weight
+            known = self.in_memory.get(state)
+            if known is not None and known.g <= g:
+                stats.duplicate()
+                if not current_node.pending:
+                    self.backup(current_node) # from the successors that remain
+                continue
+            h = known.h if known is not None else stats.heuristic(state)
+            node = utils.MemoryNode(state, current_node, direction, g, h, max(current_node.f, g + h))
+            if node.depth >= cap - 1 and not state.is_goal_state():
+                node.f = float('inf') # no room for its successors
+            self.in_memory[state] = node
+            current_node.children.append(node)
+            if not current_node.pending:
+                if current_node.forgotten_f == float('inf'):
+                    self.dequeue(current_node) # all its successors are in memory
+                self.backup(current_node)
+            if stored >= cap:
+                if not self.forget_worst_leaf():
+                    return [] # the memory cannot even hold a path
+                stored -= 1
+            self.enqueue(node)
+            stored += 1
+        return []
+
+    def next_successor( self, node, stats ):
+        """ Returns the next successor triple of the node to add to the
+        tree (its forgotten ones are generated again), None if none. """
+        if node.pending is None or (not node.pending and node.forgotten_f != float('inf')):
+            stats.expand(self.queued)
+            next_steps = node.state.get_successor_states()
+            stats.generate(len(next_steps))
+            children = set(child.state for child in node.children)
+            ancestors = set()
+            ancestor = node
+            while ancestor is not None:
+                ancestors.add(ancestor.state)
+                ancestor = ancestor.parent
+            node.pending = []
+            for triple in next_steps:
+                if triple[0] in ancestors or triple[0] in children:
+                    stats.duplicate()
+                else:
+                    node.pending.append(triple)
+            node.pending.reverse() # generated in the order of the directions
+            node.forgotten_f = float('inf')
+        if node.pending:
+            return node.pending.pop()
+        return None
+
+    def backup( self, node ):
+        """ Sets the f of a completely generated node to the lowest f of
+        its children, in memory or forgotten, and propagates the change to
+        its ancestors. """
+        while node is not None and not node.pending:
+            f = min([child.f for child in node.children] + [node.forgotten_f])
+            if f == node.f:
+                return
+            node.f = f
+            if node.in_queue:
+                self.enqueue(node) # new position
+            node = node.parent
+
+    def forget_worst_leaf( self ):
+        """ Removes the shallowest leaf of highest f from memory. Returns
+        False if the queue holds no leaf that can be forgotten. """
+        kept = []
+        while True:
+            if not self.worst:
+                self.worst = kept
+                heapq.heapify(self.worst)
+                return False
+            minus_f, depth, counter, version, node = heapq.heappop(self.worst)
+            if not node.in_queue or version != node.version:
+                continue # stale entry
+            if node.children or node.parent is None:
+                kept.append((minus_f, depth, counter, version, node))
+                continue
+            break
+        for entry in kept:
+            heapq.heappush(self.worst, entry)
+        self.dequeue(node)
+        if self.in_memory.get(node.state) is node:
+            del self.in_memory[node.state]
+        parent = node.parent
+        parent.children.remove(node)
+        parent.forgotten_f = min(parent.forgotten_f, node.f)
+        if not parent.in_queue:
+            self.enqueue(parent)
+        return True
+
+    def enqueue( self, node ):
+        if not node.in_queue:
+            self.queued += 1
+        node.in_queue = True
+        node.version += 1
+        self.counter += 1
+        heapq.heappush(self.best, (node.f, -node.depth, self.counter, node.version, node))
+        heapq.heappush(self.worst, (-node.f, node.depth, self.counter, node.version, node))
+        if len(self.best) > 4 * self.queued + 64:
+            self.compact()
+
+    def dequeue( self, node ):
+        if node.in_queue:
+            node.in_queue = False
+            self.queued -= 1
+
+    def pop_best( self ):
+        """ Returns the deepest node of lowest f, left in the queue. """
+        while True:
+            f, minus_depth, counter, version, node = self.best[0]
+            if node.in_queue and version == node.version:
+                return node
+            heapq.heappop(self.best)
 
+    def compact( self ):
+        """ Drops the stale entries of both heaps. """
+        self.best = [entry for entry in self.best if entry[4].in_queue and entry[3] == entry[4].version]
+        self.worst = [entry for entry in self.worst if entry[4].in_queue and entry[3] == entry[4].version]
+        heapq.heapify(self.best)
+        heapq.heapify(self.worst)
@@ -0,0 +1,162 @@
+# -*- coding: utf-8; mode: python -*-
+
+# ENSICAEN
+# École Nationale Supérieure d'Ingénieurs de Caen
+# 6 Boulevard Maréchal Juin
+# F-14050 Caen Cedex France
+#
+# Artificial Intelligence 2I1AE1
+
+# @file benchmark.py
+#
+# @author Régis Clouard
+
+"""
+Headless batch runner: solves puzzles with several (agent, heuristic)
+pairs without any display and writes one row of statistics per run.
+Each run is done in its own process, so that its time budget can be
+enforced and its peak memory measured independently of the others.
+"""
+
+import os
+import csv
+import json
+import time
+import resource
+import multiprocessing
+import utils
+from sokobanstate import SokobanState
+
+GRACE_PERIOD = 5 # seconds left to a child past its time budget before it is killed
+
+_ROOT = os.path.abspath(os.path.dirname(__file__))
+PUZZLE_DIRECTORY = os.path.join(_ROOT, 'puzzles')
+
+FIELDS = [ 'puzzle', 'agent', 'heuristic', 'pushes', 'status', 'time', 'expanded', 'generated',
+           'duplicates', 'reopened', 'peak_frontier', 'heuristic_calls', 'heuristic_time', 'heuristic_saved',
+           'peak_rss_kb', 'length' ]
+
+def list_puzzles( directory = PUZZLE_DIRECTORY ):
+    """ Returns the paths of the puzzle files, puzzle2 before puzzle10. """
+    names = sorted(os.listdir(directory), key = lambda name: (len(name), name))
+    return [os.path.join(directory, name) for name in names]
+
+def load_state( gridfile, pushes = False, heuristic = None ):
+    """ Returns the start state of a puzzle file. """
+    state = SokobanState()
+    with open(gridfile, "r") as level_file:
+        state.load_level(level_file)
+    state.use_push_moves(pushes)
+    if heuristic:
+        state.use_heuristic(heuristic)
+    return state
+
+def make_agent( agent_name ):
+    """ Returns a new agent from its class name in agents.py. """
+    module = __import__('agents')
+    if agent_name not in dir(module):
+        raise Exception('Unknown agent: ' + agent_name)
+    return getattr(module, agent_name)()
+
+def solve( gridfile, agent_name, heuristic = None, pushes = False, node_budget = None, cache = None,
+           time_budget = None ):
+    """ Runs one search in the current process and returns its row. The
+    solution is stored in the cache (a solutioncache.SolutionCache path)
+    if given; it is never read from it, the search is what is measured. """
+    row = dict.fromkeys(FIELDS)
+    row.update(puzzle = os.path.basename(gridfile), agent = agent_name,
+               heuristic = heuristic or 'heuristic2', pushes = pushes)
+    state = load_state(gridfile, pushes, heuristic)
+    return solve_state(state, row, agent_name, heuristic, pushes, node_budget, cache, time_budget)
+
+def solve_state( state, row, agent_name, heuristic = None, pushes = False, node_budget = None, cache = None,
+                 time_budget = None ):
+    """ Searches from the state within the budgets and fills the row with
+    the results. """
+    agent = make_agent(agent_name)
+    stats = utils.SearchStats()
+    start_time = time.time()
+    try:
+        path = agent.search(state, stats, utils.Budget(time_budget, node_budget))
+        if not path:
+            row['status'] = 'no solution'
+        elif state.is_solution(path):
+            row['status'] = 'solved'
+            row['length'] = len(path)
+            if cache:
+                import solutioncache
+                solutions = solutioncache.SolutionCache(cache)
+                solutions.put(state, agent_name, heuristic, pushes, path, stats.as_dict())
+                solutions.close()
+        else:
+            row['status'] = 'invalid'
+    except utils.NodeLimitException:
+        row['status'] = 'node limit'
+    except utils.TimeoutFunctionException:
+        row['status'] = 'timeout'
+    row['time'] = round(time.time() - start_time, 3)
+    row.update(stats.as_dict())
+    row['peak_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return row
+
+def _solve_in_child( connection, *args ):
+    try:
+        connection.send(solve(*args))
+    except Exception as ex:
+        connection.send({ 'status': 'error: %s' % ex })
+    connection.close()
+
+def run_isolated( gridfile, agent_name, heuristic = None, pushes = False,
+                  time_budget = None, node_budget = None, cache = None ):
+    """ Runs solve() in a child process. The search stops by itself after
+    time_budget seconds, and the child is killed if it does not answer
+    within GRACE_PERIOD more seconds (in the heuristic, for example). """
+    receiver, sender = multiprocessing.Pipe(False)
+    process = multiprocessing.Process(target = _solve_in_child,
+                                      args = (sender, gridfile, agent_name, heuristic, pushes, node_budget, cache,
+                                              time_budget))
+    start_time = time.time()
+    process.start()
+    sender.close()
+    row = dict.fromkeys(FIELDS)
+    row.update(puzzle = os.path.basename(gridfile), agent = agent_name,
+               heuristic = heuristic or 'heuristic2', pushes = pushes)
+    if receiver.poll(None if time_budget is None else time_budget + GRACE_PERIOD):
+        row.update(receiver.recv())
+    else:
+        process.terminate()
+        row['status'] = 'timeout'
+        row['time'] = round(time.time() - start_time, 3)
+    process.join()
+    return row
+
+class RowWriter:
+    """ Writes the rows as CSV or as JSON lines (one object per line),
+    flushing each one so that partial results survive an interruption. """
+    def __init__( self, stream, format = 'json', fields = FIELDS ):
+        self.stream = stream
+        self.csv = None
+        if format == 'csv':
+            self.csv = csv.DictWriter(stream, fieldnames = fields, extrasaction = 'ignore')
+            self.csv.writeheader()
+
+    def write( self, row ):
+        if self.csv:
+            self.csv.writerow(row)
+        else:
+            self.stream.write(json.dumps(row) + '\n')
+        self.stream.flush()
+
+def run_benchmark( stream, agent_names, heuristics = (None,), pushes = False, puzzles = None,
+                   time_budget = 60, node_budget = None, format = 'json', cache = None ):
+    """ Solves every puzzle with every (agent, heuristic) pair and
+    writes the rows to the stream. Returns the list of rows. """
+    writer = RowWriter(stream, format)
+    rows = []
+    for gridfile in puzzles or list_puzzles():
+        for agent_name in agent_names:
+            for heuristic in heuristics:
+                row = run_isolated(gridfile, agent_name, heuristic, pushes, time_budget, node_budget, cache)
+                writer.write(row)
+                rows.append(row)
+    return rows
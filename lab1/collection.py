@@ -0,0 +1,136 @@
+# -*- coding: utf-8; mode: python -*-
+
+# ENSICAEN
+# École Nationale Supérieure d'Ingénieurs de Caen
+# 6 Boulevard Maréchal Juin
+# F-14050 Caen Cedex France
+#
+# Artificial Intelligence 2I1AE1
+
+# @file collection.py
+#
+# @author Régis Clouard
+
+"""
+Collections of levels in the standard XSB (or SOK) text format: the
+levels follow each other in one file, separated by empty lines, comments
+(lines starting with ';') and tags such as 'Title: ...'. The levels are
+read lazily and translated to the characters of the puzzles directory.
+
+solve_collection() solves every level of a collection with one agent and
+writes one row per level as soon as it is solved, with the statistics of
+the benchmark module, optionally with a pool of worker processes: each
+worker solves many levels, so the start-up cost of a process is paid once.
+"""
+
+import os
+import multiprocessing
+import benchmark
+from sokobanstate import SokobanState, Level
+
+XSB = { '#': Level.wall, '@': Level.player, '+': Level.player_in_hole, '$': Level.crate,
+        '*': Level.crate_in_hole, '.': Level.hole, ' ': Level.floor, '-': Level.floor, '_': Level.floor }
+
+FIELDS = benchmark.FIELDS[:1] + [ 'title' ] + benchmark.FIELDS[1:]
+
+def is_board_line( line ):
+    """ Returns True if the line is a row of a level (and not a comment,
+    a tag or an empty line). """
+    return '#' in line and all(char in XSB for char in line)
+
+def iter_levels( lines ):
+    """ Yields a (title, rows) pair for each level of the XSB lines, where
+    rows are in the format of SokobanState.load_level(). The title is the
+    'Title:' tag right after the level, else the last comment before it,
+    else None. """
+    rows = [] # rows of the level being read
+    pending = None # [title, rows] of the level just read, while its tags may follow
+    comment = None
+    for line in lines:
+        line = line.rstrip()
+        if is_board_line(line):
+            if not rows:
+                if pending is not None:
+                    yield tuple(pending)
+                    pending = None
+                title, comment = comment, None
+            rows.append(''.join(XSB[char] for char in line))
+            continue
+        if rows:
+            pending = [title, rows]
+            rows = []
+        text = line.strip()
+        if not text:
+            if pending is not None:
+                yield tuple(pending)
+                pending = None
+        elif text.lower().startswith('title:'):
+            if pending is not None:
+                pending[0] = text[len('title:'):].strip()
+            else:
+                comment = text[len('title:'):].strip()
+        elif text.startswith(';'):
+            comment = text[1:].strip()
+        elif pending is None and ':' not in text:
+            comment = text
+    if rows:
+        pending = [title, rows]
+    if pending is not None:
+        yield tuple(pending)
+
+def load_collection( filename ):
+    """ Yields the (title, rows) pairs of the levels of an XSB file, reading
+    it as they are requested. """
+    with open(filename, "r") as stream:
+        for level in iter_levels(stream):
+            yield level
+
+def make_state( rows, pushes = False, heuristic = None ):
+    """ Returns the start state of a level given as rows. """
+    state = SokobanState()
+    state.load_level(rows)
+    state.use_push_moves(pushes)
+    if heuristic:
+        state.use_heuristic(heuristic)
+    return state
+
+def solve_level( task ):
+    """ Solves one level of a collection and returns its row. The task is
+    the tuple (name, title, rows, agent_name, heuristic, pushes,
+    time_budget, node_budget). """
+    name, title, rows, agent_name, heuristic, pushes, time_budget, node_budget = task
+    row = dict.fromkeys(FIELDS)
+    row.update(puzzle = name, title = title, agent = agent_name,
+               heuristic = heuristic or 'heuristic2', pushes = pushes)
+    try:
+        state = make_state(rows, pushes, heuristic)
+        return benchmark.solve_state(state, row, agent_name, heuristic, pushes, node_budget, None, time_budget)
+    except Exception as ex:
+        row['status'] = 'error: %s' % ex
+    return row
+
+def solve_collection( stream, filename, agent_name, heuristic = None, pushes = False,
+                      time_budget = 60, node_budget = None, jobs = 1, format = 'json' ):
+    """ Solves every level of the collection file and writes their rows to
+    the stream as they come, in the order of completion when jobs > 1.
+    Returns the number of solved levels. """
+    writer = benchmark.RowWriter(stream, format, FIELDS)
+    base = os.path.basename(filename)
+    tasks = (('%s:%d' % (base, index), title, rows, agent_name, heuristic, pushes, time_budget, node_budget)
+             for index, (title, rows) in enumerate(load_collection(filename), 1))
+    solved = 0
+    if jobs is not None and jobs <= 1:
+        rows = map(solve_level, tasks)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(jobs)
+        rows = pool.imap_unordered(solve_level, tasks)
+    try:
+        for row in rows:
+            writer.write(row)
+            if row['status'] == 'solved':
+                solved += 1
+    finally:
+        if pool is not None:
+            pool.terminate()
+    return solved
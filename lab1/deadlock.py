@@ -0,0 +1,246 @@
+# -*- coding: utf-8; mode: python -*-
+
+# ENSICAEN
+# École Nationale Supérieure d'Ingénieurs de Caen
+# 6 Boulevard Maréchal Juin
+# F-14050 Caen Cedex France
+#
+# Artificial Intelligence 2I1AE1
+
+# @file deadlock.py
+#
+# @author Régis Clouard
+
+"""
+Deadlock detection for Sokoban. A deadlock is a position from which the
+holes can no longer all be filled, whatever the player does. The search
+prunes them in SokobanState.get_successor_states():
+
+- simple dead squares: cells from which a crate cannot reach any hole,
+  even alone on the board (computed once per level by reverse pulls),
+- freeze deadlocks: a crate that can move neither horizontally nor
+  vertically and is not on a hole,
+- 2x2 deadlocks: four cells of a square all occupied by walls or crates,
+  one of the crates at least not being on a hole.
+
+The last two are checked incrementally, around the crate that just moved.
+With SokobanState.use_deadlock_patterns(), the deadlocks of a few crates
+found by small sub-searches are also learned (see PatternStore).
+"""
+
+import os
+import json
+from collections import OrderedDict, deque
+import utils
+
+def simple_dead_cells( layout ):
+    """ Returns the bitset of the floor cells from which no hole can be
+    reached by pushes (see StaticLevel.pull_distances). """
+    dead = 0
+    for cell in range(layout.size):
+        if not layout.is_wall(cell) and all(distances[cell] == utils.INFINITY for distances in layout.push_distances):
+            dead |= 1 << cell
+    return dead
+
+def is_blocked_along( layout, crates, cell, offset, frozen ):
+    """ Returns True if the crate in cell cannot move along the axis of
+    offset. The crates of the set frozen are already being checked and
+    are considered as walls, which breaks the circular dependencies. """
+    before, after = cell - offset, cell + offset
+    if layout.is_wall(before) or layout.is_wall(after):
+        return True
+    if layout.is_dead(before) and layout.is_dead(after):
+        return True
+    frozen.add(cell)
+    for neighbor in (before, after):
+        if neighbor in frozen:
+            return True
+        if (crates >> neighbor) & 1 and is_frozen(layout, crates, neighbor, frozen):
+            return True
+    return False
+
+def is_frozen( layout, crates, cell, frozen = None ):
+    """ Returns True if the crate in cell can never move again. """
+    if frozen is None:
+        frozen = set()
+    return (is_blocked_along(layout, crates, cell, 1, set(frozen))
+            and is_blocked_along(layout, crates, cell, layout.width, set(frozen)))
+
+def is_freeze_deadlock( layout, crates, cell ):
+    """ Returns True if the crate just pushed into cell, or one of its
+    neighbors, is frozen outside of a hole. """
+    if not layout.is_hole(cell):
+        return is_frozen(layout, crates, cell)
+    if not is_frozen(layout, crates, cell):
+        return False
+    # the crate is frozen in its hole: it may freeze a neighbor elsewhere
+    for offset in layout.offsets.values():
+        neighbor = cell + offset
+        if (crates >> neighbor) & 1 and not layout.is_hole(neighbor) and is_frozen(layout, crates, neighbor):
+            return True
+    return False
+
+def is_square_deadlock( layout, crates, cell ):
+    """ Returns True if one of the four 2x2 squares containing cell is
+    full of walls and crates, with a crate outside of a hole. """
+    occupied = layout.walls | crates
+    for square in layout.squares[cell]:
+        if occupied & square == square and crates & square & ~layout.holes:
+            return True
+    return False
+
+def is_deadlock( layout, crates, cell ):
+    """ Returns True if pushing a crate into cell led to a deadlock. """
+    return (layout.is_dead(cell) or is_square_deadlock(layout, crates, cell)
+            or is_freeze_deadlock(layout, crates, cell)
+            or (layout.patterns is not None and layout.patterns.is_deadlock(layout, crates, cell)))
+
+class PatternStore:
+    """
+      Deadlock patterns learned during the search: sets of crates that
+      cannot all reach holes, whatever the other crates and the player do.
+      When a crate is pushed, the crates around it (at most MAX_CRATES in a
+      WINDOW x WINDOW square) are searched alone on the board, from every
+      player region, by is_subset_solvable(). If no push sequence fills
+      holes with all of them, the set is reduced to a minimal one and
+      recorded as a bitset; any state whose crates contain it is a
+      deadlock (crates & pattern == pattern).
+
+      Patterns are indexed by cell, since a new deadlock always involves
+      the crate just pushed. At most capacity patterns are kept: the least
+      recently used ones are forgotten first. With a path, the patterns
+      saved by a previous search of the same level are loaded, and save()
+      writes them back (see SokobanState.use_deadlock_patterns()).
+    """
+    WINDOW = 3
+    MAX_CRATES = 4
+    NODE_LIMIT = 500 # states of a sub-search, beyond which it gives up
+
+    def __init__( self, capacity = 1000, path = None ):
+        self.capacity = capacity
+        self.path = path
+        self.patterns = OrderedDict() # pattern -> None, least recently used first
+        self.by_cell = {} # cell -> set of the patterns that contain it
+        self.checked = OrderedDict() # crate subsets that are not (provably) deadlocks
+        self.hits = 0
+        self.learned = 0
+        if path is not None and os.path.exists(path):
+            self.load(path)
+
+    def __len__( self ):
+        return len(self.patterns)
+
+    def add( self, pattern ):
+        if pattern in self.patterns:
+            return
+        self.patterns[pattern] = None
+        for cell in utils.iter_cells(pattern):
+            self.by_cell.setdefault(cell, set()).add(pattern)
+        if len(self.patterns) > self.capacity:
+            self.remove(next(iter(self.patterns)))
+
+    def remove( self, pattern ):
+        del self.patterns[pattern]
+        for cell in utils.iter_cells(pattern):
+            self.by_cell[cell].discard(pattern)
+
+    def match( self, crates, cell ):
+        """ Returns True if crates contain a pattern involving cell. """
+        for pattern in self.by_cell.get(cell, ()):
+            if crates & pattern == pattern:
+                self.patterns.move_to_end(pattern)
+                self.hits += 1
+                return True
+        return False
+
+    def is_deadlock( self, layout, crates, cell ):
+        """ Returns True if the crate just pushed into cell completes a known
+        pattern, or a new one found by a sub-search around it. """
+        if self.match(crates, cell):
+            return True
+        subset = self.window(layout, crates, cell)
+        if subset & (subset - 1) == 0 or subset in self.checked: # a single crate: see simple_dead_cells
+            return False
+        if is_subset_solvable(layout, subset, self.NODE_LIMIT) is not False:
+            self.checked[subset] = None
+            if len(self.checked) > self.capacity:
+                self.checked.popitem(last = False)
+            return False
+        self.add(self.minimize(layout, subset, cell))
+        self.learned += 1
+        return True
+
+    def window( self, layout, crates, cell ):
+        """ Returns the bitset of the crates closest to cell in the window
+        centered on it, cell included. """
+        row, column = layout.position(cell)
+        half = self.WINDOW // 2
+        near = []
+        for other in utils.iter_cells(crates):
+            other_row, other_column = layout.position(other)
+            if abs(other_row - row) <= half and abs(other_column - column) <= half:
+                near.append((abs(other_row - row) + abs(other_column - column), other))
+        near.sort()
+        subset = 0
+        for distance, other in near[:self.MAX_CRATES]:
+            subset |= 1 << other
+        return subset
+
+    def minimize( self, layout, subset, cell ):
+        """ Removes the crates that are not needed for the deadlock. """
+        for other in utils.iter_cells(subset):
+            smaller = subset & ~(1 << other)
+            if other != cell and smaller & (smaller - 1) and is_subset_solvable(layout, smaller, self.NODE_LIMIT) is False:
+                subset = smaller
+        return subset
+
+    def save( self, path = None ):
+        """ Writes the patterns and the subsets checked without success
+        (bitsets in hexadecimal), so that a later search skips both. """
+        with open(path or self.path, 'w') as pattern_file:
+            json.dump({ 'patterns': [format(pattern, 'x') for pattern in self.patterns],
+                        'checked': [format(subset, 'x') for subset in self.checked] }, pattern_file)
+
+    def load( self, path ):
+        with open(path) as pattern_file:
+            saved = json.load(pattern_file)
+        for pattern in saved['patterns']:
+            self.add(int(pattern, 16))
+        for subset in saved['checked'][-self.capacity:]:
+            self.checked[int(subset, 16)] = None
+
+def is_subset_solvable( layout, crates, node_limit ):
+    """ Breadth-first push search with only these crates on the board,
+    from every region the player can be in. Returns True if a state with
+    all of them on holes is reached, False if none can be, and None if
+    the search stops after node_limit states. """
+    starts = []
+    free = layout.floor & ~crates
+    while free:
+        cell = (free & -free).bit_length() - 1 # the minimum cell of its region
+        starts.append((cell, crates))
+        free &= ~layout.reachable(cell, crates)
+    visited = set(starts)
+    queue = deque(starts)
+    while queue:
+        player, crates = queue.popleft()
+        if crates & ~layout.holes == 0:
+            return True
+        region = layout.reachable(player, crates)
+        for crate in utils.iter_cells(crates):
+            for direction, targets in layout.push_targets.items():
+                target = targets[crate]
+                behind = layout.neighbors[layout.opposites[direction]][crate]
+                if target < 0 or behind < 0 or not (region >> behind) & 1 or (crates >> target) & 1:
+                    continue
+                next_crates = crates ^ ((1 << crate) | (1 << target))
+                if is_square_deadlock(layout, next_crates, target) or is_freeze_deadlock(layout, next_crates, target):
+                    continue
+                next_region = layout.reachable(crate, next_crates)
+                state = ((next_region & -next_region).bit_length() - 1, next_crates)
+                if state not in visited:
+                    if len(visited) >= node_limit:
+                        return None
+                    visited.add(state)
+                    queue.append(state)
+    return False
@@ -0,0 +1,251 @@
+# -*- coding: utf-8; mode: python -*-
+
+# ENSICAEN
+# École Nationale Supérieure d'Ingénieurs de Caen
+# 6 Boulevard Maréchal Juin
+# F-14050 Caen Cedex France
+#
+# Artificial Intelligence 2I1AE1
+
+# @file frontier.py
+#
+# @author Régis Clouard
+
+import heapq
+from collections import deque
+
+class Frontier:
+    """
+      Abstract class for the open lists of the search agents.
+      They all share the interface of utils.PriorityQueue: push() an item
+      with a priority (and optionally its heuristic value, used to break
+      ties), pop() the next (item, priority) pair, and isEmpty().
+    """
+    def push( self, item, priority = 0, h = 0 ):
+        raise Exception("Invalid Frontier class, push() not implemented")
+
+    def pop( self ):
+        raise Exception("Invalid Frontier class, pop() not implemented")
+
+    def isEmpty( self ):
+        return len(self) == 0
+
+    def update( self, key, item, priority = 0, h = 0 ):
+        """ Stores item under key, replacing the entry already stored under
+        key if the new priority is not greater. Without an index, a new entry is
+        pushed: the older one becomes stale and must be skipped when popped. """
+        self.push(item, priority, h)
+
+    def replace( self, key, item, priority = 0, h = 0 ):
+        """ Stores item under key, replacing the entry already stored under
+        key whatever its priority. Without an index, as update(). """
+        self.push(item, priority, h)
+
+class FIFO( Frontier ):
+    """ First-in first-out queue (breadth-first order). O(1) push and pop. """
+    def __init__( self ):
+        self.queue = deque()
+
+    def __len__( self ):
+        return len(self.queue)
+
+    def push( self, item, priority = 0, h = 0 ):
+        self.queue.append((item, priority))
+
+    def pop( self ):
+        return self.queue.popleft()
+
+class LIFO( Frontier ):
+    """ Last-in first-out stack (depth-first order). O(1) push and pop. """
+    def __init__( self ):
+        self.stack = []
+
+    def __len__( self ):
+        return len(self.stack)
+
+    def push( self, item, priority = 0, h = 0 ):
+        self.stack.append((item, priority))
+
+    def pop( self ):
+        return self.stack.pop()
+
+class Heap( Frontier ):
+    """
+      Binary heap returning the item with the lowest priority. Ties are
+      broken on the lowest h, then on the insertion order, so the order
+      of expansion does not depend on the memory addresses of the items.
+    """
+    def __init__( self ):
+        self.heap = []
+        self.counter = 0
+
+    def __len__( self ):
+        return len(self.heap)
+
+    def push( self, item, priority = 0, h = 0 ):
+        heapq.heappush(self.heap, (priority, h, self.counter, item))
+        self.counter += 1
+
+    def pop( self ):
+        priority, h, counter, item = heapq.heappop(self.heap)
+        return (item, priority)
+
+class IndexedHeap( Frontier ):
+    """
+      Binary heap with an index from the keys (the states) to their slot
+      in the heap, so that the priority of a stored item can be lowered in
+      place (decrease_key) instead of pushing a duplicate. Same order as
+      Heap: lowest priority, then lowest h, then insertion order.
+    """
+    def __init__( self ):
+        self.heap = [] # entries [priority, h, counter, key, item], unique counters
+                       # so that entries never compare their keys or items
+        self.index = {} # key -> slot of its entry in self.heap
+        self.counter = 0
+
+    def __len__( self ):
+        return len(self.heap)
+
+    def __contains__( self, key ):
+        return key in self.index
+
+    def push( self, item, priority = 0, h = 0, key = None ):
+        entry = [priority, h, self.counter, key, item]
+        self.counter += 1
+        self.heap.append(entry)
+        if key is not None:
+            self.index[key] = len(self.heap) - 1
+        self._sift_up(len(self.heap) - 1)
+
+    def pop( self ):
+        heap = self.heap
+        last = heap.pop()
+        if heap:
+            entry = heap[0]
+            heap[0] = last
+            if last[3] is not None:
+                self.index[last[3]] = 0
+            self._sift_down(0)
+        else:
+            entry = last
+        if entry[3] is not None:
+            del self.index[entry[3]]
+        return (entry[4], entry[0])
+
+    def priority( self, key ):
+        """ Returns the priority of the item stored under key. """
+        return self.heap[self.index[key]][0]
+
+    def decrease_key( self, key, item, priority, h = 0 ):
+        """ Replaces the item stored under key, with a priority that must
+        not be greater than its current one. """
+        slot = self.index[key]
+        entry = self.heap[slot]
+        if (priority, h) > (entry[0], entry[1]):
+            raise ValueError("decrease_key cannot raise a priority: %r > %r" % (priority, entry[0]))
+        entry[0], entry[1], entry[4] = priority, h, item
+        self._sift_up(slot)
+
+    def update( self, key, item, priority = 0, h = 0 ):
+        if key not in self.index:
+            self.push(item, priority, h, key)
+        elif (priority, h) <= tuple(self.heap[self.index[key]][:2]):
+            self.decrease_key(key, item, priority, h)
+
+    def replace( self, key, item, priority = 0, h = 0 ):
+        if key not in self.index:
+            self.push(item, priority, h, key)
+            return
+        slot = self.index[key]
+        entry = self.heap[slot]
+        entry[0], entry[1], entry[4] = priority, h, item
+        self._sift_up(slot)
+        self._sift_down(self.index[key])
+
+    def _sift_up( self, slot ):
+        heap, index = self.heap, self.index
+        entry = heap[slot]
+        while slot > 0:
+            parent = (slot - 1) >> 1
+            if heap[parent] <= entry:
+                break
+            heap[slot] = heap[parent]
+            if heap[slot][3] is not None:
+                index[heap[slot][3]] = slot
+            slot = parent
+        heap[slot] = entry
+        if entry[3] is not None:
+            index[entry[3]] = slot
+
+    def _sift_down( self, slot ):
+        heap, index = self.heap, self.index
+        size = len(heap)
+        entry = heap[slot]
+        while True:
+            child = 2 * slot + 1
+            if child >= size:
+                break
+            if child + 1 < size and heap[child + 1] < heap[child]:
+                child += 1
+            if entry <= heap[child]:
+                break
+            heap[slot] = heap[child]
+            if heap[slot][3] is not None:
+                index[heap[slot][3]] = slot
+            slot = child
+        heap[slot] = entry
+        if entry[3] is not None:
+            index[entry[3]] = slot
+
+class BucketQueue( Frontier ):
+    """
+      Bucket queue for integer priorities: an array of lists indexed by
+      the priority. Push is O(1) and pop is O(1) amortized because the
+      index of the lowest non-empty bucket only moves forward, except when
+      an item with a lower priority is pushed. Items of the same bucket
+      are returned last-in first-out, which favors the deepest nodes.
+      Items with an infinite priority (dead ends) are kept apart and
+      returned last.
+    """
+    def __init__( self ):
+        self.buckets = []
+        self.lowest = 0
+        self.size = 0
+        self.overflow = []
+
+    def __len__( self ):
+        return self.size
+
+    def push( self, item, priority = 0, h = 0 ):
+        if priority == float('inf'):
+            self.overflow.append(item)
+            self.size += 1
+            return
+        index = int(priority)
+        if index != priority or index < 0:
+            raise ValueError("BucketQueue requires non-negative integer priorities: %r" % priority)
+        while len(self.buckets) <= index:
+            self.buckets.append([])
+        self.buckets[index].append(item)
+        if index < self.lowest:
+            self.lowest = index
+        self.size += 1
+
+    def pop( self ):
+        if self.size == 0:
+            raise IndexError("pop from an empty BucketQueue")
+        self.size -= 1
+        if self.size < len(self.overflow):
+            return (self.overflow.pop(), float('inf'))
+        while not self.buckets[self.lowest]:
+            self.lowest += 1
+        return (self.buckets[self.lowest].pop(), self.lowest)
+
+FRONTIERS = { 'fifo': FIFO, 'lifo': LIFO, 'heap': Heap, 'indexed': IndexedHeap, 'bucket': BucketQueue }
+
+def make_frontier( name ):
+    """ Returns a new empty frontier from its name (see FRONTIERS). """
+    try:
+        return FRONTIERS[name]()
+    except KeyError:
+        raise Exception('Unknown frontier: ' + str(name))
@@ -0,0 +1,181 @@
+# -*- coding: utf-8; mode: python -*-
+
+# ENSICAEN
+# École Nationale Supérieure d'Ingénieurs de Caen
+# 6 Boulevard Maréchal Juin
+# F-14050 Caen Cedex France
+#
+# Artificial Intelligence 2I1AE1
+
+# @file hdastar.py
+#
+# @author Régis Clouard
+
+"""
+Hash-distributed A* (HDA*): each worker process owns the states whose
+Zobrist hash modulo the number of workers is its index. It keeps the open
+list and the best known g of its own states only, and sends the children
+it generates to their owners, in batches, through multiprocessing queues.
+
+The coordinator (the search() method of agents.HDASS) keeps the incumbent,
+the cost of the best solution found so far, and broadcasts it so that the
+workers drop their nodes with f >= incumbent. The search is over when every
+worker is idle and no batch of nodes is in flight. The coordinator checks
+this with probe waves: each worker answers with its idle flag and the
+numbers of batches it sent and received. Two consecutive waves with the
+same answers, all idle and as many batches received as sent, prove the
+termination. The path is then rebuilt by asking the owner of each state
+for its parent, from the goal back to the start.
+
+Messages are tuples whose first item is their kind. A node is sent as
+(player, crates, zobrist, g, parent, action), where parent is the
+(player, crates, zobrist) key of the parent node (None for the root).
+"""
+
+import queue
+import frontier
+import utils
+
+BATCH_SIZE = 64 # nodes per message between two workers
+EXPANSIONS_PER_ROUND = 64 # expansions between two reads of the inbox
+
+def owner( zobrist, workers ):
+    """ Returns the index of the worker that owns a state. """
+    return zobrist % workers
+
+class Worker:
+    """ One HDA* worker, run in its own process by run_worker(). """
+    def __init__( self, index, initial_state, inboxes, results ):
+        self.index = index
+        self.template = initial_state
+        self.inboxes = inboxes
+        self.inbox = inboxes[index]
+        self.results = results
+        self.open_list = frontier.IndexedHeap()
+        self.nodes = {} # (player, crates) -> (g, h, parent, action) of its best known path
+        self.closed = set() # expanded (player, crates)
+        self.outboxes = [[] for inbox in inboxes]
+        self.incumbent = float('inf')
+        self.sent = 0 # batches sent to the other workers
+        self.received = 0 # batches received
+        self.stats = utils.SearchStats()
+
+    def make_state( self, player, crates, zobrist ):
+        state = self.template.__copy__()
+        state.player = player
+        state.crates = crates
+        state.zobrist = zobrist
+        return state
+
+    def is_idle( self ):
+        return self.open_list.isEmpty() and not any(self.outboxes)
+
+    def receive( self, entries ):
+        """ Stores the nodes that improve the best known g of their state. """
+        for player, crates, zobrist, g, parent, action in entries:
+            key = (player, crates)
+            record = self.nodes.get(key)
+            if record is not None and record[0] <= g:
+                self.stats.duplicate()
+                continue
+            if record is None:
+                h = self.stats.heuristic(self.make_state(player, crates, zobrist))
+            else:
+                h = record[1]
+                if key in self.closed:
+                    self.closed.discard(key)
+                    self.stats.reopen()
+            self.nodes[key] = (g, h, parent, action)
+            if g + h < self.incumbent:
+                self.open_list.update(key, (player, crates, zobrist, g), g + h, h)
+
+    def send( self, worker ):
+        self.inboxes[worker].put(('nodes', self.outboxes[worker]))
+        self.outboxes[worker] = []
+        self.sent += 1
+
+    def flush( self ):
+        for worker, entries in enumerate(self.outboxes):
+            if entries:
+                self.send(worker)
+
+    def expand( self ):
+        """ Expands the best node of the open list. """
+        item, f = self.open_list.pop()
+        if f >= self.incumbent:
+            self.open_list = frontier.IndexedHeap() # no node left below the incumbent
+            return
+        player, crates, zobrist, g = item
+        key = (player, crates)
+        if self.nodes[key][0] < g or key in self.closed:
+            return # stale entry
+        self.closed.add(key)
+        state = self.make_state(player, crates, zobrist)
+        self.stats.expand(len(self.open_list))
+        if state.is_goal_state():
+            self.incumbent = g
+            self.results.put(('solution', g, (player, crates, zobrist)))
+            return
+        next_steps = state.get_successor_states()
+        self.stats.generate(len(next_steps))
+        workers = len(self.inboxes)
+        for next_state, action, weight in next_steps:
+            entry = (next_state.player, next_state.crates, next_state.zobrist, g + weight, (player, crates, zobrist), action)
+            worker = owner(next_state.zobrist, workers)
+            if worker == self.index:
+                self.receive([entry])
+            else:
+                self.outboxes[worker].append(entry)
+                if len(self.outboxes[worker]) >= BATCH_SIZE:
+                    self.send(worker)
+
+    def handle( self, message ):
+        """ Handles a message. Returns False on the stop message. """
+        kind = message[0]
+        if kind == 'nodes':
+            self.received += 1
+            self.receive(message[1])
+        elif kind == 'incumbent':
+            self.incumbent = min(self.incumbent, message[1])
+        elif kind == 'probe':
+            self.results.put(('status', self.index, message[1], self.is_idle(), self.sent, self.received))
+        elif kind == 'trace':
+            player, crates, zobrist = message[1]
+            g, h, parent, action = self.nodes[(player, crates)]
+            self.results.put(('parent', parent, action))
+        elif kind == 'stop':
+            self.results.put(('stats', self.index, self.stats.as_dict()))
+            return False
+        return True
+
+    def run( self ):
+        reported_idle = False
+        while True:
+            if self.open_list.isEmpty():
+                self.flush()
+                if not reported_idle:
+                    self.results.put(('idle', self.index))
+                    reported_idle = True
+                message = self.inbox.get()
+            else:
+                try:
+                    message = self.inbox.get_nowait()
+                except queue.Empty:
+                    message = None
+            while message is not None:
+                if not self.handle(message):
+                    return
+                if message[0] == 'nodes':
+                    reported_idle = False
+                try:
+                    message = self.inbox.get_nowait()
+                except queue.Empty:
+                    message = None
+            for count in range(EXPANSIONS_PER_ROUND):
+                if self.open_list.isEmpty():
+                    break
+                self.expand()
+            self.flush()
+
+def run_worker( index, initial_state, inboxes, results ):
+    Worker(index, initial_state, inboxes, results).run()
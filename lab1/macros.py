@@ -0,0 +1,201 @@
+# -*- coding: utf-8; mode: python -*-
+
+# ENSICAEN
+# École Nationale Supérieure d'Ingénieurs de Caen
+# 6 Boulevard Maréchal Juin
+# F-14050 Caen Cedex France
+#
+# Artificial Intelligence 2I1AE1
+
+# @file macros.py
+#
+# @author Régis Clouard
+
+"""
+Macro moves of the push-level search: sequences of pushes played as a
+single successor, whose cost is their number of pushes.
+
+Tunnel macro: a tunnel cell has walls on both sides across an axis. When
+the player pushes a crate along a tunnel, from a tunnel cell, the crate
+can only move along it, so it is pushed on to the end of the tunnel
+(unless it reaches a hole, another crate or a dead cell).
+
+Goal room macro: a goal room is a set of cells with holes, connected to
+the rest of the level by a single entrance cell. Its holes are filled in
+an order computed when the level is loaded, such that each crate can be
+pushed from the entrance to its hole with the previous ones in place.
+When a crate is pushed onto the entrance and the room holds exactly the
+first crates of that order, it is pushed straight to the next hole.
+
+A macro action is the tuple of its (crate, direction) pushes; see
+SokobanState.expand_path().
+"""
+
+from collections import deque
+from utils import iter_cells
+
+def flood( start, free, width ):
+    """ Returns the bitset of the cells of free connected to start. """
+    region = 1 << start
+    while True:
+        grown = (region | (region << 1) | (region >> 1) | (region << width) | (region >> width)) & free
+        if grown == region:
+            return region
+        region = grown
+
+def tunnel_cells( layout ):
+    """ Returns, for each direction, the bitset of the floor cells with
+    walls on both sides across that direction. """
+    horizontal = vertical = 0
+    for cell in range(layout.width, layout.size - layout.width):
+        if layout.is_wall(cell):
+            continue
+        if layout.is_wall(cell - layout.width) and layout.is_wall(cell + layout.width):
+            horizontal |= 1 << cell
+        if layout.is_wall(cell - 1) and layout.is_wall(cell + 1):
+            vertical |= 1 << cell
+    tunnels = {}
+    for direction, offset in layout.offsets.items():
+        tunnels[direction] = horizontal if abs(offset) == 1 else vertical
+    return tunnels
+
+def push_sequence( layout, area, crate, player, goal ):
+    """ Returns the shortest list of (crate, direction) pushes bringing a
+    crate from cell crate to cell goal, the player starting at cell player,
+    both staying in the bitset area, or None. """
+    width = layout.width
+    def normalized( player, crate ):
+        region = flood(player, area & ~(1 << crate), width)
+        return (region & -region).bit_length() - 1, region
+    start = (crate, normalized(player, crate)[0])
+    parents = { start: None }
+    queue = deque([start])
+    while queue:
+        key = queue.popleft()
+        crate, player = key
+        if crate == goal:
+            pushes = []
+            while parents[key] is not None:
+                key, push = parents[key]
+                pushes.append(push)
+            pushes.reverse()
+            return pushes
+        region = normalized(player, crate)[1]
+        for direction, offset in layout.offsets.items():
+            target = crate + offset
+            if (region >> (crate - offset)) & 1 and (area >> target) & 1 and not layout.is_dead(target):
+                next_key = (target, normalized(crate, target)[0])
+                if next_key not in parents:
+                    parents[next_key] = (key, (crate, direction))
+                    queue.append(next_key)
+    return None
+
+class GoalRoom:
+    """
+      A goal room: cells is the bitset of the room, entrance the cell that
+      connects it to the rest of the level, and order its holes in filling
+      order. filled[k] is the bitset of the first k holes of the order, and
+      pushes[(k, direction)] the pushes that bring a crate, pushed onto the
+      entrance in direction, to the hole order[k].
+    """
+    def __init__( self, layout, cells, entrance ):
+        self.cells = cells
+        self.entrance = entrance
+        self.order = []
+        self.filled = [0]
+        self.pushes = {}
+        area = cells | (1 << entrance)
+        holes = iter_cells(cells & layout.holes)
+        entries = [(direction, entrance - offset) for direction, offset in layout.offsets.items()
+                   if (cells >> (entrance + offset)) & 1 and not layout.is_wall(entrance - offset)]
+        while holes:
+            # the farthest hole that every entry direction can still fill
+            best = None
+            for hole in holes:
+                fixed = self.filled[-1]
+                sequences = {}
+                for direction, behind in entries:
+                    pushes = push_sequence(layout, (area & ~fixed) | (1 << behind), entrance, behind, hole)
+                    if pushes is None:
+                        break
+                    sequences[direction] = pushes
+                else:
+                    length = max(len(pushes) for pushes in sequences.values())
+                    if best is None or length > best[0]:
+                        best = (length, hole, sequences)
+            if best is None:
+                raise ValueError("the holes of the room cannot be filled from its entrance")
+            length, hole, sequences = best
+            for direction, pushes in sequences.items():
+                self.pushes[(len(self.order), direction)] = tuple(pushes)
+            self.order.append(hole)
+            self.filled.append(self.filled[-1] | (1 << hole))
+            holes.remove(hole)
+
+    def macro( self, crates, direction ):
+        """ Returns the pushes that bring the crate just pushed onto the
+        entrance in direction to its hole, or None if the room does not
+        hold exactly the first crates of the order. """
+        room_crates = crates & self.cells
+        for k, filled in enumerate(self.filled[:-1]):
+            if room_crates == filled:
+                return self.pushes.get((k, direction))
+        return None
+
+def find_goal_room( layout, player, crates ):
+    """ Returns the smallest GoalRoom that holds the most holes and can be
+    filled from its entrance, or None.
+    A room is a part of the floor that a single entrance cell, which is
+    neither a hole nor a dead cell, separates from the rest, and that
+    holds neither the player nor any crate at the start. """
+    floor = layout.floor
+    candidates = []
+    for entrance in iter_cells(floor & ~layout.holes & ~layout.dead):
+        rest = floor & ~(1 << entrance)
+        parts = []
+        while rest:
+            cell = (rest & -rest).bit_length() - 1
+            part = flood(cell, rest, layout.width)
+            parts.append(part)
+            rest &= ~part
+        if len(parts) < 2:
+            continue
+        for part in parts:
+            holes = bin(part & layout.holes).count('1')
+            if holes == 0 or (part >> player) & 1 or part & crates:
+                continue
+            candidates.append((-holes, bin(part).count('1'), entrance, part))
+    for holes, size, entrance, part in sorted(candidates):
+        try:
+            return GoalRoom(layout, part, entrance)
+        except ValueError:
+            continue # the next best room
+    return None
+
+def extend( layout, crates, crate, direction ):
+    """ Returns the macro (pushes, crates, cell) that starts with the push
+    of crate in direction, where crates already has the crate in its new
+    cell, or None if no macro applies. cell is where the crate ends. """
+    pushes = [(crate, direction)]
+    offset = layout.offsets[direction]
+    targets = layout.push_targets[direction]
+    tunnel = layout.tunnels[direction]
+    player, cell = crate, crate + offset
+    while ((tunnel >> player) & 1 and (tunnel >> cell) & 1 and not layout.is_hole(cell)):
+        target = targets[cell]
+        if target < 0 or (crates >> target) & 1:
+            break
+        pushes.append((cell, direction))
+        crates ^= (1 << cell) | (1 << target)
+        player, cell = cell, target
+    room = layout.goal_room
+    if room is not None and cell == room.entrance:
+        room_pushes = room.macro(crates, direction)
+        if room_pushes:
+            pushes.extend(room_pushes)
+            hole = room_pushes[-1][0] + layout.offsets[room_pushes[-1][1]]
+            crates ^= (1 << cell) | (1 << hole)
+            cell = hole
+    if len(pushes) == 1:
+        return None
+    return pushes, crates, cell
@@ -0,0 +1,164 @@
+# -*- coding: utf-8; mode: python -*-
+
+# ENSICAEN
+# École Nationale Supérieure d'Ingénieurs de Caen
+# 6 Boulevard Maréchal Juin
+# F-14050 Caen Cedex France
+#
+# Artificial Intelligence 2I1AE1
+
+# @file patterndb.py
+#
+# @author Régis Clouard
+
+"""
+Pattern database of a level: the exact number of pushes needed to bring
+every group of size crates (pairs by default) into size distinct holes,
+with the other crates removed and the player anywhere. It is computed by
+a backward breadth-first search of pulls from all the ways of filling
+size holes, so it takes into account how the crates of a group get in
+the way of each other, which the assignment of heuristic3 ignores.
+
+The costs are packed in a bytearray indexed by the group: each live cell
+(a cell from which a hole can be reached) has an index i < n, and the
+group of cells i1 < i2 < ... has the slot i1 + i2 * n + ... A lookup is
+thus O(size). UNSOLVABLE marks the groups that the backward search never
+reached, which cannot fill any holes: they are deadlocks, whatever the
+other crates. The costs that do not fit in a byte are stored as MAX_COST,
+still a lower bound.
+
+The pushes of the crates of disjoint groups add up, so the sum of the
+costs of any partition of the crates into groups is admissible, as
+long as every crate ends in a hole: SokobanState.use_pattern_database()
+builds none for a level with more crates than holes.
+value() picks the partition greedily, by decreasing surplus of a group
+over the sum of the distances of its crates to their nearest hole.
+"""
+
+import os
+from itertools import combinations
+from utils import iter_cells
+
+UNSOLVABLE = 255 # the groups that cannot be solved
+MAX_COST = 254 # the highest cost stored, a lower bound of the larger ones
+
+class PatternDatabase:
+    SIZE = 2
+
+    def __init__( self, layout, size = None, directory = None ):
+        """ Builds the database of the level layout (a StaticLevel), or
+        loads it from directory, where it is saved after being built. """
+        self.layout = layout
+        self.cells = [cell for cell in range(layout.size) if not layout.is_wall(cell) and not layout.is_dead(cell)]
+        self.index = [-1] * layout.size
+        for i, cell in enumerate(self.cells):
+            self.index[cell] = i
+        self.size = min(size or self.SIZE, len(layout.hole_cells))
+        self.nearest = [min(distances[cell] for distances in layout.push_distances) for cell in range(layout.size)]
+        self.path = None
+        if directory is not None:
+            self.path = os.path.join(directory, '%s-%d.pdb' % (layout.fingerprint(), self.size))
+        self.table = self.load()
+        if self.table is None:
+            self.table = self.build()
+            self.save()
+
+    def __len__( self ):
+        return len(self.table)
+
+    def slot( self, group ):
+        """ Returns the slot of a group of cells in increasing order. """
+        slot = 0
+        n = len(self.cells)
+        for cell in reversed(group):
+            slot = slot * n + self.index[cell]
+        return slot
+
+    def build( self ):
+        """ Backward breadth-first search of pulls, from every way of putting
+        size crates in size holes. The cost of a group is the depth of its
+        first state, whatever the player region, capped at MAX_COST. """
+        layout = self.layout
+        table = bytearray([UNSOLVABLE]) * (len(self.cells) ** self.size)
+        offsets = list(layout.offsets.values())
+        seen = set()
+        layer = []
+        for holes in combinations(layout.hole_cells, self.size):
+            crates = 0
+            for hole in holes:
+                crates |= 1 << hole
+            free = layout.floor & ~crates
+            while free:
+                player = (free & -free).bit_length() - 1 # the minimum cell of its region
+                seen.add((player, crates))
+                layer.append((player, crates))
+                free &= ~layout.reachable(player, crates)
+        depth = 0
+        while layer:
+            next_layer = []
+            for player, crates in layer:
+                group = iter_cells(crates)
+                slot = self.slot(group)
+                cost = min(depth, MAX_COST)
+                if table[slot] > cost:
+                    table[slot] = cost
+                region = layout.reachable(player, crates)
+                for crate in group:
+                    for offset in offsets:
+                        source = crate - offset # the crate cell before the push
+                        back = source - offset # the player cell before the push
+                        if ((region >> source) & 1 and not layout.is_wall(back)
+                            and not (crates >> back) & 1):
+                            previous = crates ^ ((1 << crate) | (1 << source))
+                            reached = layout.reachable(back, previous)
+                            key = ((reached & -reached).bit_length() - 1, previous)
+                            if key not in seen:
+                                seen.add(key)
+                                next_layer.append(key)
+            layer = next_layer
+            depth += 1
+        return table
+
+    def load( self ):
+        if self.path is None or not os.path.exists(self.path):
+            return None
+        with open(self.path, 'rb') as stream:
+            table = bytearray(stream.read())
+        if len(table) != len(self.cells) ** self.size:
+            return None # another layout with the same fingerprint: cannot happen, but do not trust it
+        return table
+
+    def save( self ):
+        if self.path is None:
+            return
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(self.path, 'wb') as stream:
+            stream.write(self.table)
+
+    def value( self, crates ):
+        """ Returns a lower bound of the pushes needed to fill the holes
+        with the crates of the bitset (infinite if a group is unsolvable). """
+        group_cells = iter_cells(crates)
+        nearest = self.nearest
+        total = 0
+        for cell in group_cells:
+            if self.index[cell] < 0:
+                return float('inf')
+            total += nearest[cell]
+        surpluses = []
+        for group in combinations(group_cells, self.size):
+            cost = self.table[self.slot(group)]
+            if cost == UNSOLVABLE:
+                return float('inf')
+            surplus = cost - sum(nearest[cell] for cell in group)
+            if surplus > 0:
+                surpluses.append((surplus, group))
+        surpluses.sort(reverse = True)
+        used = set()
+        for surplus, group in surpluses:
+            if used.isdisjoint(group):
+                used.update(group)
+                total += surplus
+        return total
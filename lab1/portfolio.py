@@ -0,0 +1,113 @@
+# -*- coding: utf-8; mode: python -*-
+
+# ENSICAEN
+# École Nationale Supérieure d'Ingénieurs de Caen
+# 6 Boulevard Maréchal Juin
+# F-14050 Caen Cedex France
+#
+# Artificial Intelligence 2I1AE1
+
+# @file portfolio.py
+#
+# @author Régis Clouard
+
+"""
+Parallel portfolio solver: several (agent, heuristic) pairs search the
+same puzzle at once, one process each. The first valid solution wins and
+the other searches are cancelled cooperatively: their SearchStats
+callback checks a shared event every few expansions and raises
+utils.SearchCancelledException, so that they still report their
+statistics. Processes that do not answer in time are terminated.
+"""
+
+import os
+import time
+import multiprocessing
+import queue
+import utils
+import benchmark
+
+CHECK_EVERY = 1000 # expansions between two checks of the cancel event
+GRACE_PERIOD = 5 # seconds left to the cancelled workers to report
+
+def parse_entries( text ):
+    """ Returns the (agent, heuristic) pairs of a comma-separated list of
+    AGENT or AGENT:HEURISTIC entries, such as 'ASS:heuristic3,BDS'. """
+    entries = []
+    for entry in text.split(','):
+        agent_name, _, heuristic = entry.partition(':')
+        entries.append((agent_name, heuristic or None))
+    return entries
+
+def _run_worker( index, gridfile, agent_name, heuristic, pushes, cancel, results ):
+    """ Solves the puzzle and sends (index, row, path) to the results queue. """
+    row = dict(agent = agent_name, heuristic = heuristic or 'heuristic2')
+    def check_cancel( stats ):
+        if cancel.is_set():
+            raise utils.SearchCancelledException()
+    stats = utils.SearchStats(check_cancel, CHECK_EVERY)
+    start_time = time.time()
+    path = None
+    try:
+        state = benchmark.load_state(gridfile, pushes, heuristic)
+        path = benchmark.make_agent(agent_name).search(state, stats)
+        if not path:
+            row['status'] = 'no solution'
+        elif state.is_solution(path):
+            row['status'] = 'solved'
+            row['length'] = len(path)
+        else:
+            row['status'] = 'invalid'
+    except utils.SearchCancelledException:
+        row['status'] = 'cancelled'
+    except Exception as ex:
+        row['status'] = 'error: %s' % ex
+    row['time'] = round(time.time() - start_time, 3)
+    row.update(stats.as_dict())
+    results.put((index, row, path if row['status'] == 'solved' else None))
+
+def solve( gridfile, entries, pushes = False, jobs = None, time_budget = None ):
+    """ Runs the entries on at most jobs processes (one per CPU core by
+    default) until one of them finds a valid solution or time_budget
+    seconds are over. Returns the winning path (None if none) and the
+    row of statistics of every entry, in the order of the entries. """
+    jobs = min(jobs or os.cpu_count() or 1, len(entries))
+    cancel = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    rows = [dict(agent = agent_name, heuristic = heuristic or 'heuristic2', status = 'not started')
+            for agent_name, heuristic in entries]
+    waiting = list(range(len(entries)))
+    running = {}
+    winner = None
+    deadline = None if time_budget is None else time.time() + time_budget
+    while waiting or running:
+        while waiting and len(running) < jobs and not cancel.is_set():
+            index = waiting.pop(0)
+            agent_name, heuristic = entries[index]
+            process = multiprocessing.Process(target = _run_worker,
+                                              args = (index, gridfile, agent_name, heuristic, pushes, cancel, results))
+            process.start()
+            running[index] = process
+        if not running:
+            break
+        if deadline is not None and time.time() >= deadline and not cancel.is_set():
+            cancel.set()
+            deadline = time.time() + GRACE_PERIOD # then terminate the late ones
+        elif deadline is not None and time.time() >= deadline:
+            for index, process in running.items():
+                process.terminate()
+                process.join()
+                rows[index]['status'] = 'timeout'
+            break
+        try:
+            index, row, path = results.get(timeout = 0.1)
+        except queue.Empty:
+            continue
+        running.pop(index).join()
+        rows[index] = row
+        if path is not None and winner is None:
+            winner = path
+            cancel.set()
+            if deadline is None or deadline > time.time() + GRACE_PERIOD:
+                deadline = time.time() + GRACE_PERIOD
+    return winner, rows
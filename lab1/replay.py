@@ -0,0 +1,122 @@
+# -*- coding: utf-8; mode: python -*-
+
+# ENSICAEN
+# École Nationale Supérieure d'Ingénieurs de Caen
+# 6 Boulevard Maréchal Juin
+# F-14050 Caen Cedex France
+#
+# Artificial Intelligence 2I1AE1
+
+# @file replay.py
+#
+# @author Régis Clouard
+
+"""
+Headless replay of solutions: a path (a list of directions) is played
+from a state on the player cell and the crate bitset only, with the move
+tables of the level (StaticLevel.neighbors), without copying any state
+on the way. replay() reports the first illegal move, if any, and the
+state reached; it validates thousands of solutions per second.
+
+Solutions can also be read and written in the LURD notation of the
+Sokoban community: one letter per move, in upper case for the pushes.
+"""
+
+from sokobanstate import Direction
+
+LURD = { 'l': Direction.left, 'u': Direction.up, 'r': Direction.right, 'd': Direction.down }
+
+class Replay:
+    """
+      The result of a replay: state is the state reached after the legal
+      moves, moves and pushes their numbers, and error the index of the
+      first illegal move in the path (None if they are all legal), with
+      the reason why it is illegal.
+    """
+    def __init__( self, state, moves, pushes, error = None, reason = None ):
+        self.state = state
+        self.moves = moves
+        self.pushes = pushes
+        self.error = error
+        self.reason = reason
+
+    def is_legal( self ):
+        return self.error is None
+
+    def is_solved( self ):
+        """ Returns True if every move is legal and the holes are all filled. """
+        return self.error is None and self.state.is_goal_state()
+
+    def __repr__( self ):
+        if self.error is None:
+            return 'Replay(%d moves, %d pushes, %s)' % (self.moves, self.pushes,
+                                                       'solved' if self.is_solved() else 'not solved')
+        return 'Replay(illegal move %d: %s)' % (self.error, self.reason)
+
+def replay( state, path ):
+    """ Plays the path from the state (which is not modified) and returns
+    its Replay. The replay stops at the first illegal move. """
+    layout = state.layout
+    neighbors = layout.neighbors
+    player, crates = state.player, state.crates
+    pushes = 0
+    error = reason = None
+    for index, direction in enumerate(path):
+        table = neighbors.get(direction)
+        if table is None:
+            error, reason = index, 'unknown direction %r' % (direction,)
+            break
+        cell = table[player]
+        if cell < 0:
+            error, reason = index, 'the player walks into a wall'
+            break
+        if (crates >> cell) & 1:
+            target = table[cell]
+            if target < 0:
+                error, reason = index, 'a crate is pushed into a wall'
+                break
+            if (crates >> target) & 1:
+                error, reason = index, 'a crate is pushed into another crate'
+                break
+            crates ^= (1 << cell) | (1 << target)
+            pushes += 1
+        player = cell
+    final = state.__copy__()
+    final.player = player
+    final.crates = crates
+    final.zobrist = layout.zobrist(player, crates)
+    moves = len(path) if error is None else error
+    return Replay(final, moves, pushes, error, reason)
+
+def is_solution( state, path ):
+    """ Returns True if the path is legal from the state and fills all the holes. """
+    return replay(state, path).is_solved()
+
+def parse_lurd( text ):
+    """ Returns the list of directions of a solution in LURD notation
+    (white space is ignored, the case of the letters too). """
+    directions = []
+    for letter in text:
+        if letter.isspace():
+            continue
+        if letter.lower() not in LURD:
+            raise ValueError("Invalid LURD letter: %r" % letter)
+        directions.append(LURD[letter.lower()])
+    return directions
+
+def to_lurd( state, path ):
+    """ Returns the LURD notation of a legal path from the state: the
+    pushes are written in upper case. """
+    letters = { direction: letter for letter, direction in LURD.items() }
+    neighbors = state.layout.neighbors
+    player, crates = state.player, state.crates
+    text = []
+    for direction in path:
+        cell = neighbors[direction][player]
+        if (crates >> cell) & 1:
+            crates ^= (1 << cell) | (1 << neighbors[direction][cell])
+            text.append(letters[direction].upper())
+        else:
+            text.append(letters[direction])
+        player = cell
+    return ''.join(text)
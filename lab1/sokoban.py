@@ -15,26 +15,98 @@
 import os
 import sys
 import time
-from utils import TimeoutFunctionException, TimeoutFunction
-from sokobanframe import SokobanFrame
+from utils import TimeoutFunctionException, NodeLimitException, SearchStats, Budget
+from sokobanstate import SokobanState
 
-def search_path( sokoban, agent ):
-    print("Searching.. "),
-    sys.stdout.flush()
+def print_statistics( stats, starttime, path ):
+    print("Statistics:")
+    print('    - Time                    : %.1f s' % (time.time() - starttime))
+    print("    - Number of expanded nodes: %3d" % stats.expanded)
+    print("    - Number of generated nodes: %3d (%d duplicates, %d reopened)" % (stats.generated, stats.duplicates, stats.reopened))
+    print("    - Peak open list size     : %3d" % stats.frontier_peak)
+    print('    - Heuristic time          : %.1f s (%d calls, %d saved)' % (stats.heuristic_time, stats.heuristic_calls,
+                                                                       stats.heuristic_saved))
+    print("    - Number of moves         : %3d\n" % len(path))
+
+def new_stats( progress = 0 ):
+    """ Returns the statistics of a new search, printing a progress line
+    every progress expansions if progress is not 0. """
+    if progress:
+        return SearchStats(SearchStats.report, progress)
+    return SearchStats()
+
+def use_patterns( state, patterns = 0, pattern_dir = None ):
+    """ Learns up to patterns deadlock patterns during the search (none if
+    0), saved in pattern_dir if given. Returns the store, or None. """
+    if not patterns:
+        return None
+    return state.use_deadlock_patterns(patterns, pattern_dir)
+
+def use_pdb( state, function = None, pdb_size = None, pdb_dir = None ):
+    """ Builds the pattern database of heuristic4 (or loads it from
+    pdb_dir) before the search, so that its time is reported apart. """
+    if function != 'heuristic4':
+        return
     starttime = time.time()
-    timed_func = TimeoutFunction(agent.search, 1000)
+    pdb = state.use_pattern_database(pdb_size, pdb_dir)
+    if pdb is None:
+        print("Pattern database: not used, the level has more crates than holes")
+        return
+    print("Pattern database: groups of %d crates, %d entries (%.1f s)" % (pdb.size, len(pdb), time.time() - starttime))
+
+def save_patterns( store ):
+    if store is not None:
+        print("Deadlock patterns: %d learned, %d kept, %d matches" % (store.learned, len(store), store.hits))
+        if store.path:
+            store.save()
+
+def timed_search( agent, start_state, stats, time_budget, cache = None, function = None, pushes = False ):
+    """ Runs the search within the time budget (checked by the search
+    itself, see utils.Budget) and returns its path ([] if none). With a cache (a solutioncache.SolutionCache path), a valid
+    cached solution is returned instead, and a new one is stored. """
+    solutions = None
+    if cache:
+        import solutioncache
+        solutions = solutioncache.SolutionCache(cache)
+        hit = solutions.get(start_state, type(agent).__name__, function, pushes)
+        if hit is not None:
+            path, cached_stats = hit
+            for name, value in cached_stats.items():
+                setattr(stats, 'frontier_peak' if name == 'peak_frontier' else name, value)
+            print("Done (cached solution).")
+            solutions.close()
+            return path
     try:
-        path = timed_func(sokoban.get_start_state())
+        path = agent.search(start_state, stats, Budget(time_budget))
         print("Done.")
-    except TimeoutFunctionException as ex:
+    except (TimeoutFunctionException, NodeLimitException) as ex:
         print("Error #1: time out", ex)
+        stats.report() # what the search reached
         path = []
+    if solutions is not None: # an empty cache is falsy
+        if path and start_state.is_solution(path):
+            solutions.put(start_state, type(agent).__name__, function, pushes, path, stats.as_dict())
+        solutions.close()
+    return path
+
+def search_path( sokoban, agent, pushes = False, function = None, progress = 0, patterns = 0, pattern_dir = None,
+                 cache = None, pdb_size = None, pdb_dir = None, macros = False ):
+    print("Searching.. "),
+    sys.stdout.flush()
+    starttime = time.time()
+    start_state = sokoban.get_start_state()
+    start_state.use_push_moves(pushes)
+    start_state.use_macro_moves(macros)
+    if function:
+        start_state.use_heuristic(function)
+    use_pdb(start_state, function, pdb_size, pdb_dir)
+    store = use_patterns(start_state, patterns, pattern_dir)
+    stats = new_stats(progress)
+    path = timed_search(agent, start_state, stats, 1000, cache, function, pushes)
+    save_patterns(store)
     if path:
         if sokoban.display_path(path):
-            print("Statistics:")
-            print('    - Time                    : %.1f s' % (time.time() - starttime))
-            print("    - Number of explored nodes: %3d" % SokobanFrame.number_of_explored_nodes)
-            print("    - Number of moves         : %3d\n" % len(path))
+            print_statistics(stats, starttime, path)
         else:
             sokoban.game_over()
             print("FAILED : Inconsistant solution.")
@@ -42,19 +114,90 @@ def search_path( sokoban, agent ):
         sokoban.game_over()
         print("FAILED: No solution.")
 
-def run_agent( agent, gridfile, framerate, function = None ):
+def run_agent( agent, gridfile, framerate, function = None, pushes = False, progress = 0,
+               patterns = 0, pattern_dir = None, cache = None, pdb_size = None, pdb_dir = None, macros = False ):
     """ The real main. """
+    from sokobanframe import SokobanFrame # Tk is only needed with a display
 
-    number_of_explored_nodes = 0
     if not agent: # by hand
         sokoban = SokobanFrame(gridfile, agent, function, framerate)
         sokoban.bind_all("<Key>", sokoban.key)
         sokoban.mainloop()
     else:
         sokoban = SokobanFrame(gridfile, agent, function, framerate)
-        sokoban.after(1500, search_path, sokoban, agent)
+        sokoban.after(1500, search_path, sokoban, agent, pushes, function, progress, patterns, pattern_dir, cache,
+                      pdb_size, pdb_dir, macros)
         sokoban.mainloop()
 
+def run_headless( agent, gridfile, function = None, pushes = False, time_budget = 1000, progress = 0,
+                  patterns = 0, pattern_dir = None, cache = None, pdb_size = None, pdb_dir = None, macros = False ):
+    """ Solves the grid without any display. """
+    import benchmark
+    start_state = benchmark.load_state(gridfile, pushes, function)
+    start_state.use_macro_moves(macros)
+    use_pdb(start_state, function, pdb_size, pdb_dir)
+    store = use_patterns(start_state, patterns, pattern_dir)
+    stats = new_stats(progress)
+    print("Searching.. "),
+    sys.stdout.flush()
+    starttime = time.time()
+    path = timed_search(agent, start_state, stats, time_budget, cache, function, pushes)
+    save_patterns(store)
+    if not path:
+        print("FAILED: No solution.")
+    elif not start_state.is_solution(path):
+        print("FAILED : Inconsistant solution.")
+    else:
+        print(" ".join(path))
+        print_statistics(stats, starttime, path)
+
+def run_bench( agents, functions, pushes = False, time_budget = 60, node_budget = None, output = None, cache = None ):
+    """ Solves every puzzle of the puzzles directory with every agent and
+    heuristic, and writes a row of statistics for each run. """
+    import benchmark
+    if output:
+        format = 'csv' if output.endswith('.csv') else 'json'
+        with open(output, 'w') as stream:
+            benchmark.run_benchmark(stream, agents, functions, pushes, time_budget = time_budget,
+                                    node_budget = node_budget, format = format, cache = cache)
+    else:
+        benchmark.run_benchmark(sys.stdout, agents, functions, pushes, time_budget = time_budget,
+                                node_budget = node_budget, cache = cache)
+
+def run_collection( agent, function, collection, pushes = False, jobs = None, time_budget = 60,
+                    node_budget = None, output = None ):
+    """ Solves every level of an XSB collection file with the agent and
+    writes a row of statistics for each level as soon as it is solved. """
+    import collection as xsb
+    if output:
+        format = 'csv' if output.endswith('.csv') else 'json'
+        with open(output, 'w') as stream:
+            solved = xsb.solve_collection(stream, collection, agent, function, pushes,
+                                          time_budget, node_budget, jobs, format)
+    else:
+        solved = xsb.solve_collection(sys.stdout, collection, agent, function, pushes,
+                                      time_budget, node_budget, jobs)
+    print("%d levels solved." % solved, file = sys.stderr)
+
+def run_portfolio( entries, gridfile, pushes = False, jobs = None, time_budget = None ):
+    """ Solves the grid with several (agent, heuristic) pairs in parallel
+    and prints the first valid solution and the statistics of each one. """
+    import portfolio
+    print("Searching with %d agents.. " % len(entries)),
+    sys.stdout.flush()
+    starttime = time.time()
+    path, rows = portfolio.solve(gridfile, entries, pushes, jobs, time_budget)
+    print("Done in %.1f s." % (time.time() - starttime))
+    if path:
+        print(" ".join(path))
+    else:
+        print("FAILED: No solution.")
+    print("Statistics:")
+    for row in rows:
+        print('    - %-6s %-11s %-12s %8s expanded %8s s  %s moves'
+              % (row['agent'], row['heuristic'], row['status'], row.get('expanded', '-'),
+                 row.get('time', '-'), row.get('length', '-')))
+
 def default(str):
     return str + ' [Default: %default]'
 
@@ -66,6 +209,12 @@ def read_command( argv ):
     EXAMPLES:   python sokoban.py --agent DFS --grid grid1.txt
                 OR  python sokoban.py -a DFS -g grid1.txt
                     - solve grid1 with the naive path finder
+                python sokoban.py --headless --bench -a BFS,ASS -f heuristic2,heuristic3 -o bench.csv
+                    - solve all the puzzles without display and write statistics
+                python sokoban.py --collection levels.xsb -a ASS -f heuristic3 -p -j 4
+                    - solve all the levels of a collection, one row per level
+                python sokoban.py --portfolio ASS:heuristic3,GBFS:heuristic3,BDS -p -g puzzle8.txt
+                    - run several agents in parallel, the first solution wins
     """
     parser = OptionParser(usageStr)
     
@@ -75,18 +224,114 @@ def read_command( argv ):
     parser.add_option('-g', '--grid', dest = 'grid',
                       help = 'The grid to solve', default = 'grid1.txt')
     parser.add_option('-f', '--function', dest = 'function',
-                      help = 'The heuristic to use', default = None)
+                      help = 'The heuristic to use (heuristic1, heuristic2, heuristic3)', default = None)
+    parser.add_option('-q', '--frontier', dest = 'frontier',
+                      help = 'The open list of the best-first agents (indexed, heap, bucket, fifo, lifo)', default = None)
+    parser.add_option('-p', '--pushes', dest = 'pushes', action = 'store_true',
+                      help = 'Search over crate pushes instead of player steps', default = False)
     parser.add_option('-t', '--framerate', dest = 'framerate',
                       help=default('Maximum frame rate time'), default = 200)
+    parser.add_option('--progress', dest = 'progress', type = 'int',
+                      help = 'Print the search progress every N expanded nodes', default = 0)
+    parser.add_option('--patterns', dest = 'patterns', type = 'int',
+                      help = 'Learn up to N deadlock patterns during the search', default = 0)
+    parser.add_option('--pattern-dir', dest = 'pattern_dir',
+                      help = 'Directory where the learned deadlock patterns are kept between runs', default = None)
+    parser.add_option('--lazy', dest = 'lazy', action = 'store_true',
+                      help = 'Deferred heuristic evaluation (GBFS and ASS)', default = False)
+    parser.add_option('--macros', dest = 'macros', action = 'store_true',
+                      help = 'With -p, push crates through tunnels and into goal rooms as single moves', default = False)
+    parser.add_option('--pdb-size', dest = 'pdb_size', type = 'int',
+                      help = 'Number of crates of the groups of the heuristic4 pattern database [Default: 2]', default = None)
+    parser.add_option('--pdb-dir', dest = 'pdb_dir',
+                      help = 'Directory where the heuristic4 pattern databases are kept between runs', default = None)
+    parser.add_option('--cache', dest = 'cache',
+                      help = 'Solution cache (sqlite file): reuse the solutions already found', default = None)
+    parser.add_option('--headless', dest = 'headless', action = 'store_true',
+                      help = 'Solve without any display', default = False)
+    parser.add_option('--bench', dest = 'bench', action = 'store_true',
+                      help = 'Headless benchmark of all the puzzles: -a and -f take comma-separated lists', default = False)
+    parser.add_option('--collection', dest = 'collection',
+                      help = 'Headless run over all the levels of an XSB collection file (path)', default = None)
+    parser.add_option('--portfolio', dest = 'portfolio',
+                      help = 'Solve with the comma-separated AGENT[:HEURISTIC] entries in parallel', default = None)
+    parser.add_option('-j', '--jobs', dest = 'jobs', type = 'int',
+                      help = 'Number of processes of the portfolio or collection [Default: one per CPU core]', default = None)
+    parser.add_option('--time-budget', dest = 'time_budget', type = 'int',
+                      help = default('Time budget of each run in seconds'), default = None)
+    parser.add_option('--node-budget', dest = 'node_budget', type = 'int',
+                      help = 'Maximum number of expanded nodes of each benchmark run', default = None)
+    parser.add_option('-o', '--output', dest = 'output',
+                      help = 'Benchmark output file (.csv or .json lines) [Default: stdout]', default = None)
     
     options, otherjunk = parser.parse_args(argv)
 
     if len(otherjunk) != 0:
         raise Exception('Command line input not understood: ' + str(otherjunk))
     args = dict()
-    
+
+    if options.bench:
+        if not options.agent:
+            raise Exception('The benchmark needs at least one agent')
+        args['mode'] = 'bench'
+        args['agents'] = options.agent.split(',')
+        args['functions'] = options.function.split(',') if options.function else [None]
+        args['pushes'] = options.pushes
+        args['time_budget'] = options.time_budget or 60
+        args['node_budget'] = options.node_budget
+        args['output'] = options.output
+        args['cache'] = options.cache
+        return args
+
+    if options.collection:
+        if not options.agent:
+            raise Exception('The collection mode needs an agent')
+        import agents
+        if options.agent not in dir(agents):
+            raise Exception('Unknown agent: ' + options.agent)
+        args['mode'] = 'collection'
+        args['agent'] = options.agent
+        args['function'] = options.function
+        args['collection'] = options.collection
+        args['pushes'] = options.pushes
+        args['jobs'] = options.jobs
+        args['time_budget'] = options.time_budget or 60
+        args['node_budget'] = options.node_budget
+        args['output'] = options.output
+        return args
+
+    if options.portfolio:
+        args['mode'] = 'portfolio'
+        import portfolio
+        import agents
+        args['entries'] = portfolio.parse_entries(options.portfolio)
+        for agent_name, heuristic in args['entries']:
+            if agent_name not in dir(agents):
+                raise Exception('Unknown agent: ' + agent_name)
+            if heuristic and not (heuristic.startswith('heuristic') and hasattr(SokobanState, heuristic)):
+                raise Exception('Unknown heuristic: ' + heuristic)
+        args['gridfile'] = "puzzles/" + options.grid
+        args['pushes'] = options.pushes
+        args['jobs'] = options.jobs
+        args['time_budget'] = options.time_budget
+        return args
+
+    args['mode'] = 'headless' if options.headless else 'gui'
+    args['progress'] = options.progress
+    args['patterns'] = options.patterns
+    args['pattern_dir'] = options.pattern_dir
+    args['pdb_size'] = options.pdb_size
+    args['pdb_dir'] = options.pdb_dir
+    args['macros'] = options.macros
+    args['cache'] = options.cache
     args['gridfile'] = "puzzles/" + options.grid
-    args['framerate'] = int(options.framerate)
+    args['pushes'] = options.pushes
+    if options.headless:
+        if not options.agent:
+            raise Exception('The headless mode needs an agent')
+        args['time_budget'] = options.time_budget or 1000
+    else:
+        args['framerate'] = int(options.framerate)
     if not options.agent:
         args['agent'] = None
         return args
@@ -94,22 +339,20 @@ def read_command( argv ):
         module = __import__('agents')
         if options.agent in dir(module):
             agent = getattr(module, options.agent)
-            args['agent'] = agent()
+            if options.lazy and not hasattr(agent, 'LAZY'):
+                raise Exception('Deferred heuristic evaluation is not available with ' + options.agent)
+            args['agent'] = agent(options.frontier, lazy = True) if options.lazy else agent(options.frontier)
         else:
             raise Exception('Unknown agent: ' + options.agent)
     except ImportError:
         raise Exception('No file agents.py')
     
-    # Choose a heuristic
+    # Choose a heuristic among the SokobanState methods
     if options.function != None:
-        try:
-            module = __import__('agents')
-            if options.function in dir(module):
-                args['function'] = getattr(module, options.function)
-            else:
-                raise Exception('Unknown heuristic: ' + options.function)
-        except ImportError:
-            raise Exception('No file agents.py')
+        if options.function.startswith('heuristic') and hasattr(SokobanState, options.function):
+            args['function'] = options.function
+        else:
+            raise Exception('Unknown heuristic: ' + options.function)
     return args
 
 if __name__ == '__main__':
@@ -129,4 +372,14 @@ if __name__ == '__main__':
     for arg in sys.argv:
         print(arg, end=" ")
     print("\n-------------------------------------------------------")
-    run_agent( **args )
+    mode = args.pop('mode')
+    if mode == 'bench':
+        run_bench( **args )
+    elif mode == 'portfolio':
+        run_portfolio( **args )
+    elif mode == 'collection':
+        run_collection( **args )
+    elif mode == 'headless':
+        run_headless( **args )
+    else:
+        run_agent( **args )
@@ -0,0 +1,580 @@
+# -*- coding: utf-8; mode: python -*-
+
+# ENSICAEN
+# École Nationale Supérieure d'Ingénieurs de Caen
+# 6 Boulevard Maréchal Juin
+# F-14050 Caen Cedex France
+#
+# Artificial Intelligence 2I1AE1
+
+# @file sokobanstate.py
+#
+# @author Régis Clouard
+# Based on Risto Stevcev's program (pysokoban)
+
+import os
+import random
+import hashlib
+from collections import deque
+import utils
+import deadlock
+import patterndb
+import macros
+from utils import iter_cells
+
+UNREACHABLE = utils.INFINITY
+
+class Direction( object ):
+    left = 'Left'
+    right = 'Right'
+    up = 'Up'
+    down = 'Down'
+
+class Level( object ):
+    wall = '*'
+    hole = 'o'
+    crate_in_hole = '@'
+    crate = '#'
+    player = 'P'
+    player_in_hole = '+'
+    floor = ' '
+
+class StaticLevel( object ):
+    """
+    The static part of a level: walls, holes and dead cells (see
+    deadlock.simple_dead_cells). It is built
+    once by SokobanState.load_level() and shared by every state of that level.
+
+    Cells are numbered row by row: cell = row * width + column. The grid
+    is padded with one column on the right and one row at the bottom,
+    both made of walls, so that moving from any floor cell never leaves
+    the grid. Walls, holes and dead cells are stored as integer bitsets,
+    and as the WALL, HOLE and DEAD flags of the flat array types.
+
+    The moves are compiled into tables indexed by cell, one per direction:
+    neighbors[direction][cell] is the next cell in that direction (-1 if
+    it is a wall) and push_targets[direction][cell] is where a crate in
+    cell goes when pushed (-1 if a wall or a dead cell). squares[cell] are
+    the bitmasks of the 2x2 squares that contain cell.
+
+    push_distances[i][cell] is the minimum number of pushes needed to bring
+    a crate from cell to the i-th hole of hole_cells, ignoring the other
+    crates (UNREACHABLE if it cannot).
+    """
+    WALL = 1
+    HOLE = 2
+    DEAD = 4
+
+    def __init__( self, rows ):
+        self.rows = rows # static characters, without crates nor player (for display)
+        self.height = len(rows) + 1
+        self.width = max(len(line) for line in rows) + 1
+        self.size = self.height * self.width
+        self.walls = 0
+        self.holes = 0
+        for row in range(self.height):
+            for column in range(self.width):
+                cell = self.cell(row, column)
+                if row >= len(rows) or column >= len(rows[row]) or rows[row][column] == Level.wall:
+                    self.walls |= 1 << cell
+                elif rows[row][column] == Level.hole:
+                    self.holes |= 1 << cell
+        self.offsets = { Direction.left: -1, Direction.right: 1,
+                         Direction.up: -self.width, Direction.down: self.width }
+        self.opposites = { Direction.left: Direction.right, Direction.right: Direction.left,
+                           Direction.up: Direction.down, Direction.down: Direction.up }
+        self.types = bytearray(self.size)
+        for cell in range(self.size):
+            if (self.walls >> cell) & 1:
+                self.types[cell] |= StaticLevel.WALL
+            if (self.holes >> cell) & 1:
+                self.types[cell] |= StaticLevel.HOLE
+        self.neighbors = {}
+        for direction, offset in self.offsets.items():
+            self.neighbors[direction] = [-1 if self.is_wall(cell) or self.is_wall(cell + offset) else cell + offset
+                                         for cell in range(self.size)]
+        # Zobrist keys: the hash of a state is the xor of the keys of its
+        # player cell and of its crate cells (fixed seed: reproducible runs).
+        generator = random.Random(self.size)
+        self.zobrist_player = [generator.getrandbits(64) for cell in range(self.size)]
+        self.zobrist_crate = [generator.getrandbits(64) for cell in range(self.size)]
+        self.floor = ((1 << self.size) - 1) & ~self.walls
+        self.push_moves = False # successors are single steps (False) or crate pushes (True)
+        self.heuristic = SokobanState.heuristic2
+        self.hole_cells = iter_cells(self.holes)
+        self.push_distances = [self.pull_distances(hole) for hole in self.hole_cells]
+        self.dead = deadlock.simple_dead_cells(self)
+        self.patterns = None # learned deadlocks (a deadlock.PatternStore), if any
+        self.pdb = None # pattern database of heuristic4 (a patterndb.PatternDatabase), built on demand
+        for cell in iter_cells(self.dead):
+            self.types[cell] |= StaticLevel.DEAD
+        self.push_targets = {}
+        for direction, neighbors in self.neighbors.items():
+            self.push_targets[direction] = [-1 if target < 0 or self.types[target] & StaticLevel.DEAD else target
+                                            for target in neighbors]
+        self.squares = [self.square_masks(cell) for cell in range(self.size)]
+        self.tunnels = macros.tunnel_cells(self)
+        self.goal_room = None # see macros.find_goal_room(), set by SokobanState.use_macro_moves()
+        self.goal_room_found = False # True once the goal room was looked for
+        self.macros = False # push successors extended into macro moves (see macros.extend())
+
+    def fingerprint( self ):
+        """ Returns a hash of the walls and holes, the same for every
+        level file with the same static part. """
+        return hashlib.sha1('\n'.join(line.rstrip() for line in self.rows).encode('utf-8')).hexdigest()
+
+    def cell( self, row, column ):
+        return row * self.width + column
+
+    def position( self, cell ):
+        """ Returns the (row, column) position of the cell. """
+        return divmod(cell, self.width)
+
+    def zobrist( self, player, crates ):
+        """ Computes the Zobrist hash of a state from scratch. """
+        key = self.zobrist_player[player]
+        for cell in iter_cells(crates):
+            key ^= self.zobrist_crate[cell]
+        return key
+
+    def reachable( self, player, crates ):
+        """ Returns the bitset of the cells the player can walk to
+        without pushing any crate (bit-parallel flood fill). """
+        free = self.floor & ~crates
+        width = self.width
+        region = 1 << player
+        while True:
+            grown = (region | (region << 1) | (region >> 1) | (region << width) | (region >> width)) & free
+            if grown == region:
+                return region
+            region = grown
+
+    def walk( self, start, goal, crates ):
+        """ Returns the shortest list of directions leading the player
+        from start to goal without pushing any crate, or None. """
+        parents = { start: None }
+        queue = deque([start])
+        while queue:
+            cell = queue.popleft()
+            if cell == goal:
+                directions = []
+                while parents[cell] is not None:
+                    cell, direction = parents[cell]
+                    directions.append(direction)
+                directions.reverse()
+                return directions
+            for direction, offset in self.offsets.items():
+                next_cell = cell + offset
+                if next_cell not in parents and not self.is_wall(next_cell) and not (crates >> next_cell) & 1:
+                    parents[next_cell] = (cell, direction)
+                    queue.append(next_cell)
+        return None
+
+    def pull_distances( self, hole ):
+        """ Backward BFS from the hole: the crate is pulled by a player
+        standing next to it and stepping back, which is the reverse of
+        a push. Returns the list of the push distances of every cell. """
+        distances = [UNREACHABLE] * self.size
+        distances[hole] = 0
+        queue = deque([hole])
+        while queue:
+            cell = queue.popleft()
+            for offset in self.offsets.values():
+                previous = cell + offset # where the crate was before the push
+                if (distances[previous] == UNREACHABLE and not self.is_wall(previous)
+                    and not self.is_wall(previous + offset)): # the player stands behind it
+                    distances[previous] = distances[cell] + 1
+                    queue.append(previous)
+        return distances
+
+    def square_masks( self, cell ):
+        """ Returns the bitmasks of the 2x2 squares containing cell (the
+        cells above the grid are left out: they are walls anyway). """
+        width = self.width
+        masks = []
+        for corner in (cell, cell - 1, cell - width, cell - width - 1):
+            mask = 0
+            for c in (corner, corner + 1, corner + width, corner + width + 1):
+                if 0 <= c < self.size:
+                    mask |= 1 << c
+            masks.append(mask)
+        return masks
+
+    def is_wall( self, cell ):
+        return cell < 0 or self.types[cell] & StaticLevel.WALL != 0
+
+    def is_hole( self, cell ):
+        return self.types[cell] & StaticLevel.HOLE != 0
+
+    def is_dead( self, cell ):
+        return self.types[cell] & StaticLevel.DEAD != 0
+
+class SokobanState( ):
+    """
+    A search problem defines the state space, start state, goal test,
+    successor function and cost function.  This search problem can be
+    used to find paths to a particular point on the sokoban board.
+
+    A state is only the player cell and the bitset of the crate cells;
+    the walls, holes and dead cells live once per level in the shared
+    StaticLevel object. The Zobrist hash of the state is kept up to date
+    by move_player() and move_crate(), so hashing is constant-cost.
+
+    With use_push_moves(), the successors are crate pushes instead of
+    player steps: the player walks for free inside its reachable region,
+    which is represented by its minimum cell, and expand_path() converts
+    the pushes back into directions.
+
+    Note: this search problem is fully specified; you should NOT change it.
+    """
+    __slots__ = ('layout', 'player', 'crates', 'zobrist')
+
+    def __init__( self ):
+        self.layout = None
+        self.player = -1
+        self.crates = 0
+        self.zobrist = 0
+
+    def __copy__( self ):
+        state = SokobanState()
+        state.layout = self.layout # shared
+        state.player = self.player
+        state.crates = self.crates
+        state.zobrist = self.zobrist
+        return state
+
+    def __deepcopy__( self, memo ):
+        return self.__copy__()
+
+    def __eq__( self, other ):
+        return self.player == other.player and self.crates == other.crates
+
+    def __hash__( self ):
+        return self.zobrist
+
+    @property
+    def player_position( self ):
+        """ The (row, column) position of the player. """
+        return self.layout.position(self.player)
+
+    @property
+    def level( self ):
+        """ The board as a list of rows of Level characters. """
+        level = []
+        for row, line in enumerate(self.layout.rows):
+            level_row = list(line)
+            for column, char in enumerate(level_row):
+                if (self.crates >> self.layout.cell(row, column)) & 1:
+                    level_row[column] = Level.crate_in_hole if char == Level.hole else Level.crate
+            level.append(level_row)
+        return level
+
+    def load_level( self, level_file ):
+        rows = []
+        crates = []
+        for row, line in enumerate(level_file):
+            level_row = list(line.rstrip('\n'))
+            for column, x in enumerate(level_row):
+                if x == Level.player:
+                    level_row[column] = Level.floor
+                    player = (row, column)
+
+                elif x == Level.player_in_hole:
+                    level_row[column] = Level.hole
+                    player = (row, column)
+
+                elif x == Level.crate:
+                    level_row[column] = Level.floor
+                    crates.append((row, column))
+
+                elif x == Level.crate_in_hole:
+                    level_row[column] = Level.hole
+                    crates.append((row, column))
+
+            rows.append(''.join(level_row))
+        self.layout = StaticLevel(rows)
+        self.player = self.layout.cell(*player)
+        self.crates = 0
+        for row, column in crates:
+            self.crates |= 1 << self.layout.cell(row, column)
+        self.zobrist = self.layout.zobrist(self.player, self.crates)
+
+    def use_push_moves( self, enabled = True ):
+        """ Selects crate pushes (or player steps) as the successors of
+        all the states of this level. """
+        self.layout.push_moves = enabled
+
+    def use_macro_moves( self, enabled = True ):
+        """ Extends the crate pushes of all the states of this level into
+        tunnel and goal room macro moves (see macros.py). Only the push
+        successors use them. The goal room is looked for on the first
+        call, from this state (the start state of the level). """
+        self.layout.macros = enabled
+        if enabled and not self.layout.goal_room_found:
+            self.layout.goal_room = macros.find_goal_room(self.layout, self.player, self.crates)
+            self.layout.goal_room_found = True
+
+    def use_deadlock_patterns( self, capacity = 1000, directory = None ):
+        """ Learns the deadlocks of small groups of crates during the
+        search of this level (see deadlock.PatternStore), at most capacity
+        of them. With a directory, they are loaded from and saved to a file
+        named after the level fingerprint. Returns the store. """
+        path = None
+        if directory is not None:
+            path = os.path.join(directory, self.layout.fingerprint() + '.json')
+        self.layout.patterns = deadlock.PatternStore(capacity, path)
+        return self.layout.patterns
+
+    def use_pattern_database( self, size = None, directory = None ):
+        """ Builds the pattern database of heuristic4 for this level, over
+        groups of size crates (see patterndb.PatternDatabase). With a
+        directory, it is loaded from and saved to a file named after the
+        level fingerprint. Returns the database, or None when the level
+        has more crates than holes: the costs of the database assume that
+        every crate ends in a hole, so they would not be admissible. """
+        if bin(self.crates).count('1') > len(self.layout.hole_cells):
+            return None
+        self.layout.pdb = patterndb.PatternDatabase(self.layout, size, directory)
+        return self.layout.pdb
+
+    def normalize( self ):
+        """ Moves the player to the minimum cell of its reachable region,
+        so that the states that only differ by a walk are equal. """
+        region = self.layout.reachable(self.player, self.crates)
+        cell = (region & -region).bit_length() - 1
+        self.zobrist ^= self.layout.zobrist_player[self.player] ^ self.layout.zobrist_player[cell]
+        self.player = cell
+
+    def expand_path( self, actions ):
+        """ Converts a list of actions from this state into the list of
+        directions to play. A step action is already a direction, a push
+        action (crate, direction) becomes the walk to the cell behind the
+        crate followed by the push, and a macro action (a tuple of pushes,
+        see macros.py) the concatenation of its pushes. """
+        state = self.__copy__()
+        directions = []
+        for action in actions:
+            if not isinstance(action, tuple):
+                pushes = ()
+                steps = [action]
+            else:
+                pushes = action if isinstance(action[0], tuple) else (action,)
+                steps = []
+            for crate, direction in pushes:
+                steps = self.layout.walk(state.player, crate - self.layout.offsets[direction], state.crates)
+                steps.append(direction)
+                for step in steps:
+                    state.move_player(step)
+                directions += steps
+            if not pushes:
+                state.move_player(action)
+                directions.append(action)
+        return directions
+
+    def is_solution( self, path ):
+        """ Returns True if playing the list of directions from this
+        state is legal and fills all the holes (see replay.py). """
+        import replay # replay imports this module
+        return replay.replay(self, path).is_solved()
+
+    def is_goal_state( self ) :
+        """ Returns the goal state (in your state space,
+        not the full Pacman state space).
+        """
+        return self.layout.holes & ~self.crates == 0
+
+    def get_successor_states( self ):
+        """
+        For a given state, this should return a list of triples,
+        (successor, action, stepCost), where 'successor' is a
+        successor to the current state, 'action' is the direction
+        required to get there, and 'stepCost' is the incremental
+        cost of expanding to that successor (always 1).
+
+        With push moves, the action is the pair (crate, direction) of the
+        pushed crate cell and the direction of the push.
+        """ 
+        if self.layout.push_moves:
+            return self.get_push_successor_states()
+        return self.get_step_successor_states()
+
+    def get_step_successor_states( self ):
+        """ Returns the (successor, direction, 1) triples for every
+        step of the player. """
+        layout = self.layout
+        successors = []
+        for action in [Direction.left, Direction.right, Direction.up, Direction.down]:
+            location = layout.neighbors[action][self.player]
+            if location < 0:
+                continue
+            next_state = self.__copy__()
+            if (self.crates >> location) & 1:
+                target = layout.push_targets[action][location] # -1 on walls and dead cells
+                if target < 0 or (self.crates >> target) & 1:
+                    continue
+                next_state.crates ^= (1 << location) | (1 << target)
+                # prune the pushes that lead to a deadlock
+                if deadlock.is_deadlock(layout, next_state.crates, target):
+                    continue
+                next_state.zobrist ^= layout.zobrist_crate[location] ^ layout.zobrist_crate[target]
+            next_state.zobrist ^= layout.zobrist_player[self.player] ^ layout.zobrist_player[location]
+            next_state.player = location
+            cost = 1
+            successors.append( ( next_state, action, cost) )
+
+        return successors
+
+    def get_push_successor_states( self, use_macros = True ):
+        """ Returns the (successor, (crate, direction), 1) triples for every
+        crate push the player can reach without pushing another crate. With
+        macro moves (unless use_macros is False), a push may be extended
+        into a (successor, pushes, cost) triple, where pushes is the tuple
+        of the pushes and cost their number. """
+        layout = self.layout
+        region = layout.reachable(self.player, self.crates)
+        successors = []
+        for crate in iter_cells(self.crates):
+            for direction, targets in layout.push_targets.items():
+                target = targets[crate] # -1 on walls and dead cells
+                behind = layout.neighbors[layout.opposites[direction]][crate]
+                if target >= 0 and behind >= 0 and (region >> behind) & 1 and not (self.crates >> target) & 1:
+                    crates = self.crates ^ ((1 << crate) | (1 << target))
+                    action, player, cost = (crate, direction), crate, 1
+                    if use_macros and layout.macros:
+                        macro = macros.extend(layout, crates, crate, direction)
+                        if macro is not None:
+                            pushes, crates, target = macro
+                            action, player, cost = tuple(pushes), pushes[-1][0], len(pushes)
+                    if deadlock.is_deadlock(layout, crates, target):
+                        continue
+                    next_state = self.__copy__()
+                    next_state.zobrist ^= layout.zobrist_player[self.player] ^ layout.zobrist_player[player]
+                    next_state.player = player
+                    next_state.crates = crates
+                    next_state.zobrist ^= layout.zobrist_crate[crate] ^ layout.zobrist_crate[target]
+                    next_state.normalize()
+                    successors.append( ( next_state, action, cost) )
+        return successors
+
+    def get_goal_states( self ):
+        """ Returns the goal states of this level: a crate in every hole and
+        the player in one of the regions left free, each one normalized.
+        They are the start states of a backward (pull) search. """
+        layout = self.layout
+        if bin(self.crates).count('1') != len(layout.hole_cells):
+            raise Exception("The backward search needs as many crates as holes")
+        goals = []
+        free = layout.floor & ~layout.holes
+        while free:
+            cell = (free & -free).bit_length() - 1 # the minimum cell of its region
+            state = self.__copy__()
+            state.player = cell
+            state.crates = layout.holes
+            state.zobrist = layout.zobrist(cell, layout.holes)
+            goals.append(state)
+            free &= ~layout.reachable(cell, layout.holes)
+        return goals
+
+    def get_pull_successor_states( self ):
+        """ Returns the (predecessor, (crate, direction), 1) triples for
+        every crate pull: the player stands next to a crate and steps back,
+        dragging the crate. The action is the push that leads from the
+        predecessor back to this state, as in get_push_successor_states(). """
+        layout = self.layout
+        region = layout.reachable(self.player, self.crates)
+        predecessors = []
+        for crate in iter_cells(self.crates):
+            for direction, offset in layout.offsets.items():
+                source = crate - offset # the crate cell before the push
+                back = source - offset # the player cell before the push
+                if ((region >> source) & 1 and not layout.is_wall(back)
+                    and not (self.crates >> back) & 1):
+                    previous_state = self.__copy__()
+                    previous_state.crates = self.crates ^ ((1 << crate) | (1 << source))
+                    previous_state.player = back
+                    previous_state.zobrist = (self.zobrist ^ layout.zobrist_player[self.player] ^ layout.zobrist_player[back]
+                                              ^ layout.zobrist_crate[crate] ^ layout.zobrist_crate[source])
+                    previous_state.normalize()
+                    predecessors.append( ( previous_state, (source, direction), 1) )
+        return predecessors
+
+    def move_player( self, direction ):
+        """ Moves the player one cell in the specified direction, pushing
+        the crate in front of the player if any. Returns False if the move is
+        not possible. """
+        location = self.layout.neighbors[direction][self.player]
+
+        blocked = True
+        if location >= 0:
+            blocked = self.move_crate(location, self.layout.neighbors[direction][location])
+            if not blocked:
+                self.zobrist ^= self.layout.zobrist_player[self.player] ^ self.layout.zobrist_player[location]
+                self.player = location
+
+        return not blocked
+
+    def move_crate( self, location, next_location ):
+        if not (self.crates >> location) & 1:
+            return False
+        if self.is_blocked(location, next_location):
+            return True
+        self.crates ^= (1 << location) | (1 << next_location)
+        self.zobrist ^= self.layout.zobrist_crate[location] ^ self.layout.zobrist_crate[next_location]
+        return False
+
+    def is_blocked( self, location, next_location ):
+        """ Returns True if the crate in location cannot be pushed into next_location. """
+        return self.layout.is_wall(next_location) or (self.crates >> next_location) & 1 == 1
+
+    def use_heuristic( self, name ):
+        """ Selects the heuristic method (for example 'heuristic3') used by
+        heuristic() for all the states of this level. """
+        self.layout.heuristic = getattr(SokobanState, name)
+
+    def heuristic( self ):
+        return self.layout.heuristic(self)
+
+    def heuristic1( self ):
+        """ Number of misplaced crates. """
+        return bin(self.crates & ~self.layout.holes).count('1')
+
+    def heuristic2( self ):
+        """ Manhattan distance of crates to nearest hole. """
+        crates = [self.layout.position(cell) for cell in iter_cells(self.crates & ~self.layout.holes)]
+        holes = [self.layout.position(cell) for cell in iter_cells(self.layout.holes & ~self.crates)]
+
+        def manhattanDistance( c1, c2 ):
+            return abs(c1[0] - c2[0]) + abs(c1[1] - c2[1])
+
+        total_distance = 0
+        for crate in crates:
+            distance = 1e30
+            for hole in holes:
+                d = manhattanDistance(crate, hole)
+                if (d < distance):
+                    distance = d
+            total_distance += distance
+
+        return total_distance
+
+    def heuristic3( self ):
+        """ Minimum-cost assignment of the crates to the holes, where the
+        cost is the true push distance (walls included) and each hole
+        takes a single crate. Infinite when the crates cannot fill the holes. """
+        crates = iter_cells(self.crates)
+        if len(crates) < len(self.layout.hole_cells):
+            return float('inf')
+        costs = [[distances[crate] for crate in crates] for distances in self.layout.push_distances]
+        total_distance = utils.min_cost_assignment(costs)
+        if total_distance >= UNREACHABLE:
+            return float('inf')
+        return total_distance
+
+    def heuristic4( self ):
+        """ Maximum of heuristic3 and of the pattern database of the
+        level, which adds the exact costs of groups of crates (see
+        patterndb.PatternDatabase, built on the first call if needed).
+        heuristic3 alone when the level has more crates than holes. """
+        if self.layout.pdb is None and self.use_pattern_database() is None:
+            return self.heuristic3()
+        return max(self.layout.pdb.value(self.crates), self.heuristic3())
@@ -0,0 +1,85 @@
+# -*- coding: utf-8; mode: python -*-
+
+# ENSICAEN
+# École Nationale Supérieure d'Ingénieurs de Caen
+# 6 Boulevard Maréchal Juin
+# F-14050 Caen Cedex France
+#
+# Artificial Intelligence 2I1AE1
+
+# @file solutioncache.py
+#
+# @author Régis Clouard
+
+"""
+On-disk cache of the solutions, in a sqlite database. A solution is
+stored under the hash of the level (see level_hash) and the identity of
+the search: agent, heuristic and push moves. A cached solution is
+replayed before it is returned, and dropped if it does not solve the
+level. At most max_entries solutions are kept: the least recently used
+ones are removed first.
+"""
+
+import json
+import time
+import sqlite3
+import hashlib
+from sokobanstate import Level
+
+def level_hash( state ):
+    """ Returns the hash of the level text of the state, rebuilt from the
+    state itself so that it does not depend on the layout of the file
+    (trailing spaces, empty lines, crates already in holes...). """
+    rows = state.level
+    row, column = state.player_position
+    rows[row][column] = Level.player_in_hole if rows[row][column] == Level.hole else Level.player
+    text = '\n'.join(''.join(line).rstrip() for line in rows).rstrip('\n')
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+class SolutionCache:
+    MAX_ENTRIES = 10000
+
+    def __init__( self, path, max_entries = None ):
+        self.path = path
+        self.max_entries = max_entries or self.MAX_ENTRIES
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS solutions (
+                                   level TEXT, agent TEXT, heuristic TEXT, pushes INTEGER,
+                                   path TEXT, stats TEXT, last_used REAL,
+                                   PRIMARY KEY (level, agent, heuristic, pushes))""")
+        self.connection.commit()
+
+    def __len__( self ):
+        return self.connection.execute("SELECT COUNT(*) FROM solutions").fetchone()[0]
+
+    def close( self ):
+        self.connection.close()
+
+    def get( self, state, agent, heuristic = None, pushes = False ):
+        """ Returns the (path, stats) pair cached for this level and search,
+        or None if there is none or if its path does not solve the level. """
+        key = (level_hash(state), agent, heuristic or '', int(pushes))
+        row = self.connection.execute("""SELECT path, stats FROM solutions WHERE level = ? AND agent = ?
+                                         AND heuristic = ? AND pushes = ?""", key).fetchone()
+        if row is None:
+            return None
+        path = row[0].split()
+        if not state.is_solution(path):
+            self.connection.execute("""DELETE FROM solutions WHERE level = ? AND agent = ?
+                                       AND heuristic = ? AND pushes = ?""", key)
+            self.connection.commit()
+            return None
+        self.connection.execute("""UPDATE solutions SET last_used = ? WHERE level = ? AND agent = ?
+                                   AND heuristic = ? AND pushes = ?""", (time.time(),) + key)
+        self.connection.commit()
+        return path, json.loads(row[1])
+
+    def put( self, state, agent, heuristic, pushes, path, stats = None ):
+        """ Stores the path (a list of directions) found from the state, with
+        its statistics (a dictionary, see utils.SearchStats.as_dict()). """
+        key = (level_hash(state), agent, heuristic or '', int(pushes))
+        self.connection.execute("INSERT OR REPLACE INTO solutions VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                key + (' '.join(path), json.dumps(stats or {}), time.time()))
+        self.connection.execute("""DELETE FROM solutions WHERE rowid IN (SELECT rowid FROM solutions
+                                   ORDER BY last_used DESC LIMIT -1 OFFSET ?)""", (self.max_entries,))
+        self.connection.commit()
@@ -0,0 +1,123 @@
+# -*- coding: utf-8; mode: python -*-
+
+# ENSICAEN
+# École Nationale Supérieure d'Ingénieurs de Caen
+# 6 Boulevard Maréchal Juin
+# F-14050 Caen Cedex France
+#
+# Artificial Intelligence 2I1AE1
+
+# @file test_agents.py
+#
+# @author Régis Clouard
+
+import os
+import unittest
+import agents
+import benchmark
+import hdastar
+import utils
+
+class GraphState:
+    """
+      A state of an explicit graph, with the interface of SokobanState
+      used by the agents: the action to a successor is its name.
+    """
+    def __init__( self, graph, heuristics, goal, name ):
+        self.graph = graph
+        self.heuristics = heuristics
+        self.goal = goal
+        self.name = name
+
+    def __eq__( self, other ):
+        return self.name == other.name
+
+    def __hash__( self ):
+        return hash(self.name)
+
+    def is_goal_state( self ):
+        return self.name == self.goal
+
+    def get_successor_states( self ):
+        return [(GraphState(self.graph, self.heuristics, self.goal, name), name, cost)
+                for name, cost in self.graph.get(self.name, [])]
+
+    def heuristic( self ):
+        return self.heuristics.get(self.name, 0)
+
+    def expand_path( self, actions ):
+        return actions
+
+# S reaches X first through P1 (g = 11), then more cheaply through P2
+# (g = 2), whose h is larger: the consistent heuristic queues X with a
+# higher priority the second time.
+REOPEN_GRAPH = { 'S': [('P1', 1), ('P2', 1)], 'P1': [('X', 10)], 'P2': [('X', 1)], 'X': [('G', 8)] }
+REOPEN_HEURISTICS = { 'P2': 9, 'X': 8 }
+
+# A cheaper goal behind a heavier edge, deferred after a first goal was
+# found: the slack grows while that goal waits.
+SLACK_GRAPH = { 'S': [('A1', 1), ('Q', 1)], 'Q': [('P', 1)], 'P': [('X', 3)], 'X': [('G', 4)] }
+for index in range(1, 9):
+    SLACK_GRAPH['A%d' % index] = [('A%d' % (index + 1), 1)]
+SLACK_GRAPH['A9'] = [('G', 1)]
+SLACK_HEURISTICS = { 'Q': 8, 'P': 7, 'X': 4 }
+
+class TestLazyAStar( unittest.TestCase ):
+
+    def start( self ):
+        return GraphState(REOPEN_GRAPH, REOPEN_HEURISTICS, 'G', 'S')
+
+    def test_reopen_with_higher_priority( self ):
+        for frontier in ('indexed', 'heap'):
+            for lazy in (False, True):
+                path = agents.ASS(frontier, lazy = lazy).search(self.start())
+                self.assertEqual(path, ['P2', 'X', 'G'], (frontier, lazy))
+
+    def test_goal_waits_for_the_slack( self ):
+        for frontier in ('indexed', 'heap'):
+            for lazy in (False, True):
+                path = agents.ASS(frontier, lazy = lazy).search(GraphState(SLACK_GRAPH, SLACK_HEURISTICS, 'G', 'S'))
+                self.assertEqual(path, ['Q', 'P', 'X', 'G'], (frontier, lazy))
+
+    def test_gbfs_reopen( self ):
+        for frontier in ('indexed', 'heap'):
+            path = agents.GBFS(frontier, lazy = True).search(self.start())
+            self.assertEqual(path[-1], 'G', frontier)
+
+    def test_saved_counted_once_per_state( self ):
+        stats = utils.SearchStats()
+        agents.ASS(lazy = True).search(self.start(), stats)
+        # S, P1, P2, X and G are evaluated at most once each
+        self.assertLessEqual(stats.heuristic_calls, 5)
+        self.assertGreaterEqual(stats.heuristic_saved, 0)
+        self.assertEqual(stats.heuristic_calls + stats.heuristic_saved, 5)
+
+def crashing_worker( index, initial_state, inboxes, results ):
+    if index == 0:
+        os._exit(3) # as if killed, without any message
+    hdastar.Worker(index, initial_state, inboxes, results).run()
+
+class TestHDAStar( unittest.TestCase ):
+
+    def test_dead_worker( self ):
+        state = benchmark.load_state(os.path.join(benchmark.PUZZLE_DIRECTORY, 'puzzle1.txt'), True, 'heuristic3')
+        run_worker = hdastar.run_worker
+        hdastar.run_worker = crashing_worker
+        try:
+            with self.assertRaises(utils.WorkerFailedException):
+                agents.HDASS(workers = 2).search(state)
+        finally:
+            hdastar.run_worker = run_worker
+
+class TestSMAStar( unittest.TestCase ):
+
+    def test_small_memory_is_optimal( self ):
+        for heuristic in ('heuristic2', 'heuristic3'):
+            state = benchmark.load_state(os.path.join(benchmark.PUZZLE_DIRECTORY, 'puzzle1.txt'), False, heuristic)
+            optimal = agents.ASS().search(state)
+            path = agents.SMASS(max_nodes = 60).search(state, None, utils.Budget(30))
+            self.assertEqual(state.is_solution(path), True, heuristic)
+            self.assertEqual(len(path), len(optimal), heuristic)
+
+if __name__ == '__main__':
+    unittest.main()
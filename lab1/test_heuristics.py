@@ -0,0 +1,51 @@
+# -*- coding: utf-8; mode: python -*-
+
+# ENSICAEN
+# École Nationale Supérieure d'Ingénieurs de Caen
+# 6 Boulevard Maréchal Juin
+# F-14050 Caen Cedex France
+#
+# Artificial Intelligence 2I1AE1
+
+# @file test_heuristics.py
+#
+# @author Régis Clouard
+
+import unittest
+import agents
+from sokobanstate import SokobanState
+
+def load( rows, heuristic ):
+    state = SokobanState()
+    state.load_level(rows)
+    state.use_push_moves(True)
+    state.use_heuristic(heuristic)
+    return state
+
+class TestPatternDatabase( unittest.TestCase ):
+
+    def test_more_crates_than_holes( self ):
+        # two crates, one hole: the cheapest crate needs 2 pushes, the other none
+        state = load(['*******',
+                      '*P # o*',
+                      '*  #  *',
+                      '*     *',
+                      '*******'], 'heuristic4')
+        self.assertIsNone(state.use_pattern_database())
+        self.assertLessEqual(state.heuristic4(), 2)
+        path = agents.ASS().search(state)
+        self.assertEqual(state.is_solution(path), True)
+
+    def test_costs_beyond_a_byte( self ):
+        # two crates at 128 pushes each from the holes of a long corridor
+        length = 126
+        state = load(['*' * (length + 6),
+                      '*o' + ' ' * length + ' # *',
+                      '*o' + ' ' * length + ' #P*',
+                      '*' * (length + 6)], 'heuristic4')
+        pdb = state.use_pattern_database()
+        self.assertEqual(pdb.value(state.crates), 256)
+        self.assertEqual(state.heuristic4(), 256)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -12,6 +12,7 @@
 # @author Régis Clouard
 
 import sys
+import time
 import inspect
 import heapq
 
@@ -43,12 +44,287 @@ class PriorityQueue:
         """ Returns true if the queue is empty."""
         return len(self.heap) == 0
 
+INFINITY = 10 ** 9
+
+def min_cost_assignment( costs ):
+    """
+      Hungarian algorithm: returns the minimum total cost of assigning
+      each row of the cost matrix to a distinct column (there must be at
+      least as many columns as rows). Runs in O(rows^2 * columns).
+      Costs must be integers lower than INFINITY.
+    """
+    n = len(costs)
+    if n == 0:
+        return 0
+    m = len(costs[0])
+    u = [0] * (n + 1)
+    v = [0] * (m + 1)
+    assigned = [0] * (m + 1) # row assigned to each column (1-based, 0: none)
+    way = [0] * (m + 1)
+    for row in range(1, n + 1):
+        assigned[0] = row
+        column0 = 0
+        minv = [INFINITY * n] * (m + 1)
+        used = [False] * (m + 1)
+        while True:
+            used[column0] = True
+            row0 = assigned[column0]
+            cost_row = costs[row0 - 1]
+            delta = INFINITY * n
+            column1 = 0
+            for column in range(1, m + 1):
+                if not used[column]:
+                    current = cost_row[column - 1] - u[row0] - v[column]
+                    if current < minv[column]:
+                        minv[column] = current
+                        way[column] = column0
+                    if minv[column] < delta:
+                        delta = minv[column]
+                        column1 = column
+            for column in range(m + 1):
+                if used[column]:
+                    u[assigned[column]] += delta
+                    v[column] -= delta
+                else:
+                    minv[column] -= delta
+            column0 = column1
+            if assigned[column0] == 0:
+                break
+        while column0:
+            column1 = way[column0]
+            assigned[column0] = assigned[column1]
+            column0 = column1
+    return sum(costs[assigned[column] - 1][column - 1] for column in range(1, m + 1) if assigned[column])
+
+def iter_cells( bitset ):
+    """ Returns the indices of the cells set in the specified bitset,
+    in increasing order. """
+    cells = []
+    while bitset:
+        low = bitset & -bitset
+        cells.append(low.bit_length() - 1)
+        bitset ^= low
+    return cells
+
+class SearchNode:
+    """
+      A node of the search tree: the state, the node it was generated
+      from, the action that led to it, its path cost g and its heuristic
+      value h. Nodes only point to their parent, so generating a child
+      costs O(1) whatever its depth; the path is rebuilt once, at the goal.
+    """
+    __slots__ = ('state', 'parent', 'action', 'g', 'h')
+
+    def __init__( self, state, parent = None, action = None, g = 0, h = 0 ):
+        self.state = state
+        self.parent = parent
+        self.action = action
+        self.g = g
+        self.h = h
+
+    def path( self ):
+        """ Returns the list of actions from the root node to this node."""
+        actions = []
+        node = self
+        while node.parent is not None:
+            actions.append(node.action)
+            node = node.parent
+        actions.reverse()
+        return actions
+
+class MemoryNode( SearchNode ):
+    """
+      A node of the SMA* search tree, which is kept in memory: f is the
+      backed-up f value, children are the successors in memory, pending
+      the successors still to generate (None: not generated yet) and
+      forgotten_f the lowest f of the children that were forgotten.
+    """
+    __slots__ = ('f', 'depth', 'children', 'pending', 'forgotten_f', 'in_queue', 'version')
+
+    def __init__( self, state, parent = None, action = None, g = 0, h = 0, f = 0 ):
+        SearchNode.__init__(self, state, parent, action, g, h)
+        self.f = f
+        self.depth = 0 if parent is None else parent.depth + 1
+        self.children = []
+        self.pending = None
+        self.forgotten_f = float('inf')
+        self.in_queue = False
+        self.version = 0
+
+def node_bytes( state ):
+    """ Rough memory size of a stored search node: the node, its state
+    and the integers of the state, plus a hash table entry. """
+    size = sys.getsizeof(MemoryNode(state)) + sys.getsizeof(state) + 64
+    for name in getattr(state, '__slots__', ()):
+        value = getattr(state, name)
+        if isinstance(value, int):
+            size += sys.getsizeof(value)
+    return size
+
+class Budget:
+    """
+      Limits of a search, checked cooperatively at each expansion (see
+      SearchStats.expand()): a time limit in seconds, a maximum number of
+      expanded nodes and a maximum number of stored nodes, counted as the
+      generated nodes that were not duplicates. TimeoutFunctionException
+      is raised past the deadline and NodeLimitException past the node
+      limits, from the search loop itself: no signal is needed, so a
+      search can run in any thread, and its statistics stay available.
+    """
+    CHECK_EVERY = 64 # expansions between two reads of the clock
+
+    def __init__( self, seconds = None, max_expanded = None, max_stored = None ):
+        self.seconds = seconds
+        self.max_expanded = max_expanded
+        self.max_stored = max_stored
+        self.deadline = None
+        self.start()
+
+    def start( self ):
+        """ Starts the clock of the time limit. """
+        if self.seconds is not None:
+            self.deadline = time.time() + self.seconds
+
+    def remaining( self ):
+        """ Returns the seconds left before the deadline (None if none). """
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.time())
+
+    def check( self, stats ):
+        """ Raises the exception of the first limit that stats exceeds. """
+        if self.max_expanded is not None and stats.expanded > self.max_expanded:
+            raise NodeLimitException("more than %d expanded nodes" % self.max_expanded)
+        if self.max_stored is not None and stats.generated - stats.duplicates > self.max_stored:
+            raise NodeLimitException("more than %d stored nodes" % self.max_stored)
+        if (self.deadline is not None and stats.expanded % self.CHECK_EVERY == 0
+            and time.time() > self.deadline):
+            raise TimeoutFunctionException("more than %g s" % self.seconds)
+
+class SearchStats:
+    """
+      Counters of one search, filled by the agents: expanded nodes,
+      generated successors, duplicates (successors already known),
+      reopenings (known states reached again with a lower cost), the peak
+      size of the open list, the time spent in the heuristic and the
+      calls saved by the deferred evaluation of the lazy agents. best_h
+      is the lowest heuristic value met and f_bound the highest f value
+      expanded by the agents that report it (the lower bound of the
+      optimal cost reached by A* and IDA*).
+
+      If a callback is given, it is called with this object every
+      sample_every expansions (live progress reports). The budget (a
+      Budget) is checked at each expansion; max_expanded is a shortcut
+      for a budget limited to that many expansions.
+    """
+    def __init__( self, callback = None, sample_every = 10000, max_expanded = None, budget = None ):
+        self.expanded = 0
+        self.generated = 0
+        self.duplicates = 0
+        self.reopened = 0
+        self.frontier_peak = 0
+        self.heuristic_calls = 0
+        self.heuristic_time = 0.0
+        self.heuristic_saved = 0
+        self.best_h = float('inf')
+        self.f_bound = 0
+        self.start_time = time.time()
+        self.callback = callback
+        self.sample_every = sample_every
+        if budget is None and max_expanded is not None:
+            budget = Budget(max_expanded = max_expanded)
+        self.budget = budget
+
+    def use_budget( self, budget ):
+        """ Limits the search to the budget (None: no limit), from now on. """
+        if budget is not None:
+            budget.start()
+        self.budget = budget
+
+    def check_budget( self ):
+        """ Raises the exception of the exceeded limit of the budget, if any
+        (for the loops that do not expand nodes themselves). """
+        if self.budget is not None:
+            self.budget.check(self)
+
+    def expand( self, frontier_size = 0, f = None ):
+        """ Counts an expansion; frontier_size is the current size of the
+        open list and f the f value of the expanded node, if known."""
+        self.expanded += 1
+        if frontier_size > self.frontier_peak:
+            self.frontier_peak = frontier_size
+        if f is not None and f > self.f_bound:
+            self.f_bound = f
+        if self.budget is not None:
+            self.budget.check(self)
+        if self.callback is not None and self.expanded % self.sample_every == 0:
+            self.callback(self)
+
+    def generate( self, count = 1 ):
+        self.generated += count
+
+    def duplicate( self ):
+        self.duplicates += 1
+
+    def reopen( self ):
+        self.reopened += 1
+
+    def defer( self ):
+        """ Counts a node queued without its heuristic value (lazy agents)."""
+        self.heuristic_saved += 1
+
+    def heuristic( self, state, deferred = False ):
+        """ Returns state.heuristic(), timing the call. deferred is True
+        for the evaluation of a node queued by defer(): this call was not
+        saved after all."""
+        start = time.perf_counter()
+        h = state.heuristic()
+        self.heuristic_time += time.perf_counter() - start
+        self.heuristic_calls += 1
+        if deferred:
+            self.heuristic_saved -= 1
+        if h < self.best_h:
+            self.best_h = h
+        return h
+
+    def elapsed( self ):
+        return time.time() - self.start_time
+
+    def nodes_per_second( self ):
+        elapsed = self.elapsed()
+        return self.expanded / elapsed if elapsed > 0 else 0.0
+
+    def as_dict( self ):
+        return { 'expanded': self.expanded, 'generated': self.generated,
+                 'duplicates': self.duplicates, 'reopened': self.reopened,
+                 'peak_frontier': self.frontier_peak, 'heuristic_calls': self.heuristic_calls,
+                 'heuristic_time': round(self.heuristic_time, 3), 'heuristic_saved': self.heuristic_saved }
+
+    def report( self ):
+        """ Prints a progress line (usable as a callback)."""
+        print('    %9d expanded, %9d generated, %7.0f nodes/s, peak open list %d, best h %s, f bound %s'
+              % (self.expanded, self.generated, self.nodes_per_second(), self.frontier_peak,
+                 self.best_h, self.f_bound))
+        sys.stdout.flush()
+
 ## code to handle timeouts
 import signal
 class TimeoutFunctionException(Exception):
     """Exception to raise on a timeout"""
     pass
 
+class NodeLimitException(Exception):
+    """Exception to raise when a search expands too many nodes"""
+    pass
+
+class SearchCancelledException(Exception):
+    """Exception to raise when a search is cancelled from outside"""
+    pass
+
+class WorkerFailedException(Exception):
+    """Exception to raise when a worker process of a parallel search dies"""
+    pass
+
 class TimeoutFunction:
     def __init__(self, function, timeout):
         self.timeout = timeout
@@ -65,6 +341,6 @@ class TimeoutFunction:
         try:
             result = self.function(*args)
         finally:
+            signal.alarm(0)
             signal.signal(signal.SIGALRM, old)
-        signal.alarm(0)
         return result